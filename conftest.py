@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    """Миниатюры готовятся синхронно: фоновый поток не должен писать
+    во временный MEDIA_ROOT, который тест уже удаляет.
+    """
+
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,94 @@
+from http import HTTPStatus
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+
+class ApiTest(TestCase):
+    """Тестирование JSON API лент."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.author = User.objects.create_user(
+            username="Lermontov", first_name="Михаил"
+        )
+        cls.group = Group.objects.create(title="Тестовая группа", slug="g")
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for number in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(
+                author=cls.author, text=f"Пост {number}", group=cls.group
+            )
+        cls.post = Post.objects.first()
+        Comment.objects.create(post=cls.post, author=cls.user, text="Да")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feeds(self):
+        """Ленты отдают страницу постов, справочники и курсор."""
+
+        urls = (
+            reverse("api:index"),
+            reverse("api:group_list", args=(self.group.slug,)),
+            reverse("api:profile", args=(self.author.username,)),
+            reverse("api:follow_index"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.authorized_client.get(url).json()
+                self.assertEqual(len(data["results"]), POSTS_PER_PAGE)
+                self.assertEqual(data["results"][0]["id"], self.post.pk)
+                self.assertEqual(
+                    data["authors"][str(self.author.pk)],
+                    {"username": "Lermontov", "name": "Михаил"},
+                )
+                self.assertEqual(
+                    data["groups"][str(self.group.pk)]["slug"], "g"
+                )
+                rest = self.authorized_client.get(
+                    url, {"cursor": data["next"]}
+                ).json()
+                self.assertEqual(len(rest["results"]), 1)
+                self.assertIsNone(rest["next"])
+
+    def test_feed_queries(self):
+        """Страница ленты: посты, авторы и группы - три запроса."""
+
+        with self.assertNumQueries(3):
+            self.client.get(reverse("api:index"))
+
+    def test_post_and_comments(self):
+        """Пост и его комментарии."""
+
+        data = self.client.get(
+            reverse("api:post_detail", args=(self.post.pk,))
+        ).json()
+        self.assertEqual(data["result"]["comments"], 1)
+        data = self.client.get(
+            reverse("api:post_comments", args=(self.post.pk,))
+        ).json()
+        self.assertEqual(data["results"][0]["text"], "Да")
+        self.assertIn(str(self.user.pk), data["authors"])
+
+    def test_errors(self):
+        """Ошибки отдаются в JSON с правильным статусом."""
+
+        responses = (
+            (self.client.get(reverse("api:follow_index")),
+             HTTPStatus.UNAUTHORIZED),
+            (self.client.get(reverse("api:post_detail", args=(0,))),
+             HTTPStatus.NOT_FOUND),
+            (self.client.get(reverse("api:group_list", args=("none",))),
+             HTTPStatus.NOT_FOUND),
+            (self.client.get(reverse("api:post_comments", args=(0,))),
+             HTTPStatus.NOT_FOUND),
+        )
+        for response, status in responses:
+            with self.subTest(status=status):
+                self.assertEqual(response.status_code, status)
+                self.assertIn("detail", response.json())
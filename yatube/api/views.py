@@ -0,0 +1,163 @@
+from http import HTTPStatus
+
+from django.http import JsonResponse
+
+from core.utils import paginate
+from posts.models import Comment, Group, Post, User
+from yatube.settings import COMMENTS_PER_PAGE
+
+POST_FIELDS = (
+    "id", "text", "pub_date", "author", "group", "image", "comments_count",
+)
+COMMENT_FIELDS = ("id", "text", "created", "author")
+
+
+def json_response(data, status=HTTPStatus.OK):
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def error(detail, status):
+    return json_response({"detail": detail}, status=status)
+
+
+def expand_authors(author_ids):
+    """Авторы страницы одним запросом, только нужные колонки."""
+
+    authors = User.objects.filter(pk__in=set(author_ids)).only(
+        "id", "username", "first_name", "last_name"
+    )
+    return {
+        author.pk: {
+            "username": author.username,
+            "name": author.get_full_name(),
+        }
+        for author in authors
+    }
+
+
+def expand_groups(group_ids):
+    groups = Group.objects.filter(pk__in=set(group_ids) - {None}).only(
+        "id", "slug", "title"
+    )
+    return {
+        group.pk: {"slug": group.slug, "title": group.title}
+        for group in groups
+    }
+
+
+def serialize_post(post):
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date,
+        "author": post.author_id,
+        "group": post.group_id,
+        "image": post.image.url if post.image else None,
+        "comments": post.comments_count,
+    }
+
+
+def posts_response(page):
+    """Страница постов с авторами и группами, вынесенными в справочники."""
+
+    return json_response({
+        "results": [serialize_post(post) for post in page],
+        "authors": expand_authors(post.author_id for post in page),
+        "groups": expand_groups(post.group_id for post in page),
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+
+
+def posts_page(request, posts):
+    return paginate(request, posts.only(*POST_FIELDS), keyset=True)
+
+
+def index(request):
+    """Лента всех постов."""
+
+    return posts_response(posts_page(request, Post.objects.all()))
+
+
+def group_posts(request, slug):
+    """Лента постов группы."""
+
+    group_id = (
+        Group.objects.filter(slug=slug).values_list("pk", flat=True).first()
+    )
+    if group_id is None:
+        return error("Группа не найдена", HTTPStatus.NOT_FOUND)
+    posts = Post.objects.filter(group_id=group_id)
+    return posts_response(posts_page(request, posts))
+
+
+def profile(request, username):
+    """Лента постов автора."""
+
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if author_id is None:
+        return error("Автор не найден", HTTPStatus.NOT_FOUND)
+    posts = Post.objects.filter(author_id=author_id)
+    return posts_response(posts_page(request, posts))
+
+
+def follow_index(request):
+    """Лента подписок: страница inbox, посты догружаются одним запросом."""
+
+    if not request.user.is_authenticated:
+        return error("Требуется авторизация", HTTPStatus.UNAUTHORIZED)
+    page = paginate(
+        request, request.user.inbox.only("pub_date", "post"), keyset=True
+    )
+    posts = Post.objects.only(*POST_FIELDS).in_bulk(
+        [entry.post_id for entry in page]
+    )
+    page.object_list = [
+        posts[entry.post_id] for entry in page if entry.post_id in posts
+    ]
+    return posts_response(page)
+
+
+def post_detail(request, post_id):
+    """Пост с автором и группой."""
+
+    post = Post.objects.only(*POST_FIELDS).filter(pk=post_id).first()
+    if post is None:
+        return error("Пост не найден", HTTPStatus.NOT_FOUND)
+    return json_response({
+        "result": serialize_post(post),
+        "authors": expand_authors([post.author_id]),
+        "groups": expand_groups([post.group_id]),
+    })
+
+
+def post_comments(request, post_id):
+    """Комментарии поста страницами по курсору."""
+
+    comments = Comment.objects.filter(post_id=post_id).only(*COMMENT_FIELDS)
+    page = paginate(request, comments, COMMENTS_PER_PAGE, keyset=True)
+    # Пустая страница - возможно, поста нет.
+    if not page and not Post.objects.filter(pk=post_id).exists():
+        return error("Пост не найден", HTTPStatus.NOT_FOUND)
+    return json_response({
+        "results": [
+            {
+                "id": comment.pk,
+                "text": comment.text,
+                "created": comment.created,
+                "author": comment.author_id,
+            }
+            for comment in page
+        ],
+        "authors": expand_authors(comment.author_id for comment in page),
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
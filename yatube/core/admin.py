@@ -0,0 +1,90 @@
+import json
+
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .models import RequestProfile
+from .profiling import make_token
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Профили только просматриваются: самые медленные запросы сверху."""
+
+    list_display = (
+        "url_name",
+        "method",
+        "status",
+        "duration_ms",
+        "sql_count",
+        "sql_ms",
+        "requested",
+        "created",
+    )
+    list_filter = ("requested", "url_name")
+    search_fields = ("=url_name", "path")
+    readonly_fields = ("slowest_queries",)
+    exclude = ("queries",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def slowest_queries(self, obj):
+        return "\n\n".join(
+            f"{query['ms']} мс: {query['sql']}"
+            for query in json.loads(obj.queries or "[]")
+        )
+
+    slowest_queries.short_description = "Самые долгие запросы к базе"
+
+    def get_urls(self):
+        view = self.admin_site.admin_view
+        return [
+            path(
+                "<int:pk>/download/",
+                view(self.download),
+                name="core_requestprofile_download",
+            ),
+            path(
+                "token/",
+                view(self.token),
+                name="core_requestprofile_token",
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk):
+        """Свернутые стеки файлом для flamegraph.pl или speedscope."""
+
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            profile.stacks, content_type="text/plain; charset=utf-8"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="profile-{profile.pk}.folded"'
+        )
+        return response
+
+    def token(self, request):
+        """Значение заголовка X-Profile для профилирования своих запросов."""
+
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Заголовок для профилирования",
+            "token": make_token(request.user),
+        }
+        return TemplateResponse(
+            request, "admin/core/requestprofile/token.html", context
+        )
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
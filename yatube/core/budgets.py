@@ -0,0 +1,73 @@
+"""Бюджеты страниц: сколько запросов к базе и миллисекунд может занять
+ответ по каждому адресу приложений posts и users.
+
+Число запросов не должно зависеть от объема данных, поэтому бюджет
+запросов точный: лишний запрос в цикле шаблона сразу его превышает.
+Время - грубый потолок, который ловит только заметные регрессии.
+"""
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+Budget = namedtuple("Budget", ("queries", "ms"))
+
+PAGE_MS = 300
+FRAGMENT_MS = 150
+
+BUDGETS = {
+    "posts:index": Budget(4, PAGE_MS),
+    "posts:group_list": Budget(6, PAGE_MS),
+    "posts:profile": Budget(7, PAGE_MS),
+    "posts:post_detail": Budget(5, PAGE_MS),
+    "posts:post_comments": Budget(1, FRAGMENT_MS),
+    "posts:search": Budget(3, PAGE_MS),
+    # Плюс запрос на каждые EXPORT_CHUNK_SIZE выгружаемых строк.
+    "posts:export": Budget(4, PAGE_MS),
+    "posts:post_create": Budget(5, PAGE_MS),
+    "posts:post_edit": Budget(6, PAGE_MS),
+    "posts:add_comment": Budget(5, FRAGMENT_MS),
+    "posts:follow_index": Budget(4, PAGE_MS),
+    "posts:profile_follow": Budget(11, FRAGMENT_MS),
+    "posts:profile_unfollow": Budget(7, FRAGMENT_MS),
+    "users:signup": Budget(0, PAGE_MS),
+    "users:logout": Budget(4, PAGE_MS),
+    "users:login": Budget(0, PAGE_MS),
+    "users:password_change_form": Budget(2, PAGE_MS),
+    "users:password_change_done": Budget(2, PAGE_MS),
+    "users:password_reset_form": Budget(0, PAGE_MS),
+    "users:password_reset_done": Budget(0, PAGE_MS),
+    "users:password_reset_confirm": Budget(5, PAGE_MS),
+    "users:password_reset_complete": Budget(0, PAGE_MS),
+}
+
+
+@contextmanager
+def within_budget(name, budgets=BUDGETS):
+    """Проверяет, что код внутри блока уложился в бюджет адреса name.
+
+    При превышении бросает AssertionError со списком выполненных SQL.
+    """
+
+    budget = budgets[name]
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        yield
+        elapsed = (time.perf_counter() - start) * 1000
+    problems = []
+    if len(queries) > budget.queries:
+        problems.append(
+            f"запросов {len(queries)} при бюджете {budget.queries}"
+        )
+    if elapsed > budget.ms:
+        problems.append(f"{elapsed:.0f} мс при бюджете {budget.ms} мс")
+    if problems:
+        statements = "\n".join(
+            f"{number}. {query['sql']}"
+            for number, query in enumerate(queries.captured_queries, 1)
+        )
+        raise AssertionError(
+            f"{name}: {', '.join(problems)}\n{statements}"
+        )
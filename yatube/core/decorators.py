@@ -0,0 +1,59 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from yatube.settings import FEED_PAGE_TIMEOUT
+from .uploads import BoundedUploadHandler
+
+
+def cache_anonymous_page(get_version, timeout=FEED_PAGE_TIMEOUT):
+    """Кэширует отрендеренную страницу для анонимных пользователей.
+
+    Ключ складывается из адреса страницы (вместе с номером страницы или
+    курсором) и версии, которую возвращает ``get_version`` с аргументами
+    представления. Смена версии сразу делает старые страницы недоступными;
+    ``None`` вместо версии отключает кэш для запроса.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            version = get_version(request, *args, **kwargs)
+            if version is None:
+                return view(request, *args, **kwargs)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f"page:{view.__name__}:{version}:{path}"
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response.content, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def bounded_uploads(view):
+    """Принимает файлы запроса через ``BoundedUploadHandler``.
+
+    Обработчики загрузки нужно подменить до первого чтения request.POST,
+    а его читает проверка CSRF, поэтому она переносится внутрь.
+    """
+
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [BoundedUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,43 @@
+"""Блокировки между процессами одного сервера.
+
+Кэш по умолчанию (LocMemCache) у каждого процесса свой, поэтому
+``cache.add`` не защищает от соседних воркеров. Здесь блокировка -
+``flock`` на файле в ``LOCK_ROOT``. Имена раскладываются по
+``LOCK_STRIPES`` файлам, поэтому файлы блокировок не копятся, а разные
+имена изредка ждут друг друга.
+"""
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+def _lock_path(name):
+    digest = int(hashlib.md5(name.encode()).hexdigest(), 16)
+    return os.path.join(
+        settings.LOCK_ROOT, f"{digest % settings.LOCK_STRIPES}.lock"
+    )
+
+
+@contextmanager
+def file_lock(name, blocking=True):
+    """Держит блокировку имени name, пока открыт блок.
+
+    Возвращает True, если блокировка взята; без ``blocking`` занятая
+    блокировка не ждется, а возвращается False.
+    """
+
+    os.makedirs(settings.LOCK_ROOT, exist_ok=True)
+    with open(_lock_path(name), "a") as lock:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Время запроса')),
+                ('url_name', models.CharField(blank=True, max_length=200, verbose_name='Адрес')),
+                ('path', models.CharField(max_length=2000, verbose_name='Путь')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус ответа')),
+                ('requested', models.BooleanField(default=False, help_text='Снят по заголовку X-Profile, а не случайной выборкой', verbose_name='По заголовку')),
+                ('duration_ms', models.FloatField(verbose_name='Время, мс')),
+                ('sql_count', models.PositiveIntegerField(verbose_name='Запросов к базе')),
+                ('sql_ms', models.FloatField(verbose_name='Время в базе, мс')),
+                ('stacks', models.TextField(blank=True, help_text='Свернутые стеки: «кадр;кадр;... число снимков»', verbose_name='Стеки')),
+                ('queries', models.TextField(blank=True, help_text='JSON', verbose_name='Самые долгие запросы к базе')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ('-duration_ms',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='requestprofile',
+            index=models.Index(fields=['-duration_ms'], name='core_profile_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestprofile',
+            index=models.Index(fields=['url_name', '-duration_ms'], name='core_profile_url_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый core.profiling."""
+
+    created = models.DateTimeField("Время запроса", auto_now_add=True)
+    url_name = models.CharField("Адрес", max_length=200, blank=True)
+    path = models.CharField("Путь", max_length=2000)
+    method = models.CharField("Метод", max_length=10)
+    status = models.PositiveSmallIntegerField("Статус ответа")
+    requested = models.BooleanField(
+        "По заголовку",
+        default=False,
+        help_text="Снят по заголовку X-Profile, а не случайной выборкой",
+    )
+    duration_ms = models.FloatField("Время, мс")
+    sql_count = models.PositiveIntegerField("Запросов к базе")
+    sql_ms = models.FloatField("Время в базе, мс")
+    stacks = models.TextField(
+        "Стеки",
+        blank=True,
+        help_text="Свернутые стеки: «кадр;кадр;... число снимков»",
+    )
+    queries = models.TextField(
+        "Самые долгие запросы к базе", blank=True, help_text="JSON"
+    )
+
+    class Meta:
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+        ordering = ("-duration_ms",)
+        indexes = (
+            models.Index(
+                fields=("-duration_ms",), name="core_profile_duration_idx"
+            ),
+            models.Index(
+                fields=("url_name", "-duration_ms"),
+                name="core_profile_url_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.url_name or self.path} {self.duration_ms:.0f} мс"
@@ -0,0 +1,176 @@
+"""Профилирование запросов в бою.
+
+Профилируется случайная доля запросов (``PROFILER_SAMPLE_RATE``) и
+запросы с заголовком ``X-Profile``, в котором лежит подписанный токен
+сотрудника (его выдает страница профилей в админке). Стеки снимает
+отдельный поток раз в ``PROFILER_INTERVAL`` секунд, без трассировки
+каждого вызова, поэтому профилируемый запрос почти не замедляется,
+а остальные не платят ничего.
+
+Потоковые ответы (StreamingHttpResponse, например выгрузки постов)
+профилируются только до заголовков: тело отдается уже после того, как
+middleware вернул ответ.
+"""
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connection
+
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_PROFILE"
+TOKEN_SALT = "core.profiling"
+
+
+def make_token(user):
+    """Токен для заголовка X-Profile; действует PROFILER_TOKEN_MAX_AGE."""
+
+    return signing.dumps({"user": user.pk}, salt=TOKEN_SALT)
+
+
+def token_is_valid(token):
+    """Токен подписан, не просрочен и выдан действующему сотруднику."""
+
+    try:
+        payload = signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return get_user_model().objects.filter(
+        pk=payload.get("user"), is_active=True, is_staff=True
+    ).exists()
+
+
+def collapse(frame):
+    """Стек кадра в строку «модуль.функция;...» от корня к вершине."""
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        names.append(f"{module}.{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Поток, который периодически снимает стек другого потока."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse(frame)] += 1
+
+    def collapsed(self):
+        """Стеки в формате flamegraph.pl / speedscope."""
+
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.counts.most_common()
+        )
+
+
+class QueryTimer:
+    """Обертка выполнения SQL (connection.execute_wrapper), которая
+    замеряет каждый запрос.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.queries.append((elapsed, sql))
+
+    def slowest(self, limit):
+        return [
+            {"ms": round(elapsed, 3), "sql": sql[:2000]}
+            for elapsed, sql in sorted(self.queries, reverse=True)[:limit]
+        ]
+
+
+class RequestProfilerMiddleware:
+    """Снимает профиль выбранных запросов и сохраняет его в
+    RequestProfile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = self.requested(request)
+        if not requested and random.random() >= settings.PROFILER_SAMPLE_RATE:
+            return self.get_response(request)
+        sampler = StackSampler(
+            threading.get_ident(), settings.PROFILER_INTERVAL
+        )
+        timer = QueryTimer()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = (time.perf_counter() - start) * 1000
+        try:
+            self.save(request, response, requested, duration, sampler, timer)
+        except Exception:
+            # Профиль не должен ломать ответ.
+            logger.exception("Не удалось сохранить профиль запроса")
+        return response
+
+    def requested(self, request):
+        token = request.META.get(HEADER)
+        return bool(token) and token_is_valid(token)
+
+    def save(self, request, response, requested, duration, sampler, timer):
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            url_name=match.view_name if match else "",
+            path=request.path[:2000],
+            method=request.method,
+            status=response.status_code,
+            requested=requested,
+            duration_ms=round(duration, 3),
+            sql_count=len(timer.queries),
+            sql_ms=round(sum(elapsed for elapsed, _ in timer.queries), 3),
+            stacks=sampler.collapsed(),
+            queries=json.dumps(
+                timer.slowest(settings.PROFILER_MAX_QUERIES),
+                ensure_ascii=False,
+            ),
+        )
+        # Старые профили удаляются по id, без подсчета строк.
+        RequestProfile.objects.filter(
+            pk__lte=profile.pk - settings.PROFILER_KEEP
+        ).delete()
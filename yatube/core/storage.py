@@ -0,0 +1,70 @@
+import hashlib
+import os
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .locks import file_lock
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла, прочитанного кусками."""
+
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хэш его содержимого.
+
+    ``posts/cat.gif`` сохраняется как ``posts/ab/<sha256>.gif``: одинаковые
+    картинки занимают один файл и получают общие миниатюры. Хэш берется
+    из ``content.content_hash``, если его посчитали при загрузке
+    (см. ``BoundedUploadHandler``). Файл удаляют, когда на него не
+    остается ссылок.
+
+    Повторное использование файла обновляет его mtime под блокировкой
+    имени (``lock``): удаление под той же блокировкой видит, что файл
+    только что понадобился новому, еще не сохраненному посту.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = getattr(content, "content_hash", None) or content_hash(
+            content
+        )
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        with self.lock(name):
+            if self.exists(name):
+                os.utime(self.path(name))
+                return name
+            return self._save(name, content).replace("\\", "/")
+
+    def lock(self, name):
+        return file_lock(f"storage:{self.location}:{name}")
+
+    def recently_used(self, name, seconds):
+        """Файл сохранен или повторно использован за последние seconds."""
+
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except (FileNotFoundError, SuspiciousFileOperation):
+            return False
+        return modified > time.time() - seconds
+
+
+post_images = ContentAddressedStorage()
@@ -1,6 +1,20 @@
+import json
+import subprocess
+import sys
+import threading
+import time
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .locks import _lock_path, file_lock
+from .models import RequestProfile
+from .profiling import StackSampler, make_token
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +23,134 @@ class ViewTestClass(TestCase):
         response = self.client.get("/nonexist-page/")
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+@override_settings(PROFILER_INTERVAL=0.001)
+class RequestProfilerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def setUp(self):
+        # Главная страница кэшируется, а профиль нужен с запросами к базе.
+        cache.clear()
+
+    def test_not_sampled_by_default(self):
+        """Без выборки и заголовка профиль не снимается."""
+        self.client.get(reverse("posts:index"))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        """Профиль запроса из выборки хранит адрес, стеки и SQL."""
+        self.client.get(reverse("posts:index"))
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.url_name, "posts:index")
+        self.assertEqual(profile.status, HTTPStatus.OK)
+        self.assertFalse(profile.requested)
+        self.assertGreater(profile.sql_count, 0)
+        queries = json.loads(profile.queries)
+        self.assertEqual(len(queries), profile.sql_count)
+        self.assertIn("SELECT", queries[0]["sql"])
+
+    def test_signed_header(self):
+        """Запрос с токеном сотрудника профилируется."""
+        self.client.get(
+            reverse("posts:index"), HTTP_X_PROFILE=make_token(self.admin)
+        )
+        profile = RequestProfile.objects.get()
+        self.assertTrue(profile.requested)
+
+    def test_bad_or_expired_header(self):
+        """Подделанный или просроченный токен игнорируется."""
+        token = make_token(self.admin)
+        self.client.get(reverse("posts:index"), HTTP_X_PROFILE=token + "x")
+        with override_settings(PROFILER_TOKEN_MAX_AGE=-1):
+            self.client.get(reverse("posts:index"), HTTP_X_PROFILE=token)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_header_of_former_staff(self):
+        """Токен перестает действовать, когда у пользователя отняли
+        права сотрудника или отключили учетную запись.
+        """
+        token = make_token(self.admin)
+        for field in ("is_staff", "is_active"):
+            with self.subTest(field=field):
+                User.objects.filter(pk=self.admin.pk).update(**{field: False})
+                self.client.get(reverse("posts:index"), HTTP_X_PROFILE=token)
+                self.assertFalse(RequestProfile.objects.exists())
+                User.objects.filter(pk=self.admin.pk).update(**{field: True})
+
+    def test_sampler_collects_stacks(self):
+        """Поток снимает стеки того потока, за которым следит."""
+        sampler = StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            pass
+        sampler.stop()
+        self.assertIn(f"{__name__}.test_sampler_collects_stacks",
+                      sampler.collapsed())
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_KEEP=2)
+    def test_old_profiles_pruned(self):
+        """Хранится не больше PROFILER_KEEP профилей."""
+        for _ in range(4):
+            self.client.get(reverse("posts:index"))
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_admin_pages(self):
+        """Список профилей, профиль, стеки и токен доступны в админке."""
+        profile = RequestProfile.objects.create(
+            path="/", method="GET", status=200, duration_ms=12.5,
+            sql_count=1, sql_ms=0.5, stacks="main;view 3",
+            queries='[{"ms": 0.5, "sql": "SELECT 1"}]',
+        )
+        self.client.force_login(self.admin)
+        pages = (
+            reverse("admin:core_requestprofile_changelist"),
+            reverse("admin:core_requestprofile_change", args=(profile.pk,)),
+            reverse("admin:core_requestprofile_token"),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(
+            reverse("admin:core_requestprofile_download", args=(profile.pk,))
+        )
+        self.assertEqual(response.content, b"main;view 3")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+
+class FileLockTests(TestCase):
+    TRY_LOCK = (
+        "import fcntl, sys\n"
+        "with open(sys.argv[1], 'a') as lock:\n"
+        "    try:\n"
+        "        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)\n"
+        "    except BlockingIOError:\n"
+        "        sys.exit(1)\n"
+    )
+
+    def other_process_locks(self, name):
+        return not subprocess.run(
+            (sys.executable, "-c", self.TRY_LOCK, _lock_path(name))
+        ).returncode
+
+    def test_lock_excludes_other_processes(self):
+        """Блокировку, взятую здесь, не может взять другой процесс."""
+        with file_lock("thumbnail:a") as locked:
+            self.assertTrue(locked)
+            self.assertFalse(self.other_process_locks("thumbnail:a"))
+        self.assertTrue(self.other_process_locks("thumbnail:a"))
+
+    def test_busy_lock_without_waiting(self):
+        """Без ожидания занятая блокировка возвращает False."""
+        with file_lock("thumbnail:a"):
+            with file_lock("thumbnail:a", blocking=False) as locked:
+                self.assertFalse(locked)
+        with file_lock("thumbnail:a", blocking=False) as locked:
+            self.assertTrue(locked)
@@ -0,0 +1,156 @@
+"""Загрузка картинок с ограниченным расходом памяти.
+
+Файл пишется на диск кусками и не дальше ``IMAGE_UPLOAD_MAX_SIZE``,
+разрешение проверяется по заголовку, а полное декодирование, которое
+требует памяти на все пиксели, выполняется в отдельном процессе.
+
+Процессы пула запускаются через ``spawn``, а не ``fork``: сервер
+многопоточный (рядом работает пул миниатюр), а копия такого процесса
+может унаследовать захваченные другими потоками блокировки. Зависшее
+декодирование не бросается в пуле, а завершается вместе с пулом:
+иначе несколько медленных картинок заняли бы все его процессы.
+Декодирования других загрузок, шедшие в этом пуле, при этом тоже
+отклоняются.
+"""
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as PoolTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл кусками, не держа ее в памяти.
+
+    После ``IMAGE_UPLOAD_MAX_SIZE`` байт запись прекращается, но размер
+    файла считается дальше: ``size`` слишком большой загрузки больше
+    предела, и форма отклоняет ее, не читая содержимое.
+
+    По пути считается SHA-256 записанного (``content_hash`` файла), чтобы
+    хранилищу не пришлось читать файл еще раз.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        limit = settings.IMAGE_UPLOAD_MAX_SIZE + 1
+        if start < limit:
+            chunk = raw_data[:limit - start]
+            self.digest.update(chunk)
+            self.file.write(chunk)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.content_hash = self.digest.hexdigest()
+        return upload
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DECODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool, kill=False):
+    """Убирает пул: следующая загрузка поднимет новый. С ``kill``
+    процессы пула завершаются сразу, не дожидаясь своих задач.
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False)
+
+
+def _decode(source, max_pixels):
+    """Полностью декодирует картинку; ошибка значит битый файл."""
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    with Image.open(source) as image:
+        image.load()
+
+
+def _run_decode(upload):
+    if hasattr(upload, "temporary_file_path"):
+        source = upload.temporary_file_path()
+    else:
+        upload.seek(0)
+        source = upload.read()
+    max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+    if not settings.IMAGE_DECODE_WORKERS:
+        return _decode(source, max_pixels)
+    pool = _get_pool()
+    try:
+        future = pool.submit(_decode, source, max_pixels)
+        return future.result(timeout=settings.IMAGE_DECODE_TIMEOUT)
+    except PoolTimeoutError:
+        _discard_pool(pool, kill=True)
+        raise
+    except BrokenProcessPool:
+        # Процесс убит (например, OOM).
+        _discard_pool(pool)
+        raise
+
+
+def check_size(upload):
+    limit = settings.IMAGE_UPLOAD_MAX_SIZE
+    if upload.size > limit:
+        raise ValidationError(
+            f"Размер файла не должен превышать {filesizeformat(limit)}."
+        )
+
+
+def check_image(upload):
+    """Проверяет загруженную картинку.
+
+    Формат и разрешение берутся из заголовка, который уже прочитало поле
+    ``ImageField``; только после этого картинка декодируется целиком
+    в пуле процессов ``IMAGE_DECODE_WORKERS``.
+    """
+
+    check_size(upload)
+    image = upload.image
+    if image.format not in IMAGE_FORMATS:
+        raise ValidationError(
+            "Поддерживаются только картинки " + ", ".join(IMAGE_FORMATS)
+            + "."
+        )
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            f"Слишком большое разрешение картинки: {width}x{height}."
+        )
+    try:
+        _run_decode(upload)
+    except PoolTimeoutError:
+        raise ValidationError("Не удалось обработать картинку вовремя.")
+    except Exception:
+        raise ValidationError("Файл поврежден или не является картинкой.")
+    finally:
+        upload.seek(0)
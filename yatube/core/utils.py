@@ -1,10 +1,326 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+from yatube.settings import FEED_COUNT_TIMEOUT, POSTS_PER_PAGE
+
+CURSOR_PARAM = "cursor"
+
+# Не больше 999 параметров запроса в старых версиях SQLite.
+PARAMS_PER_QUERY = 500
+
+
+def _cursor_value(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точная позиция.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values, reverse=False):
+    """Упаковывает позицию в ленте в непрозрачную строку для ?cursor=."""
+
+    payload = json.dumps(
+        [values, reverse], default=_cursor_value, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор. Для испорченного курсора возвращает None."""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values, reverse = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values, bool(reverse)
+
+
+class CursorPage(Sequence):
+    """Страница курсорной паджинации.
+
+    Повторяет интерфейс ``Page``, которым пользуются шаблоны
+    (итерация, ``has_next``, ``has_previous``, ``has_other_pages``),
+    но вместо номеров страниц отдает курсоры соседних страниц.
+    """
+
+    is_cursor = True
+
+    def __init__(
+        self, object_list, paginator, cursor, next_cursor, previous_cursor
+    ):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor or ""
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<Cursor page {self.cursor!r}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-паджинатор: выбирает страницу по значениям полей сортировки
+    последней показанной записи, без COUNT(*) и OFFSET.
+
+    Последним полем сортировки должен быть уникальный ключ (обычно id),
+    иначе записи с одинаковыми значениями будут теряться на границе страниц.
+    """
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        model = object_list.model
+        ordering = (
+            ordering
+            or object_list.query.order_by
+            or model._meta.ordering
+        )
+        self.ordering = []
+        for name in ordering:
+            descending = name.startswith("-")
+            field = model._meta.get_field(name.lstrip("-"))
+            self.ordering.append((field, descending))
+
+    def _order_by(self, reverse):
+        return [
+            ("-" if descending != reverse else "") + field.attname
+            for field, descending in self.ordering
+        ]
+
+    def _seek(self, values, reverse):
+        """Условие «строго после позиции» для выбранного направления."""
+
+        condition = Q()
+        for index, (field, descending) in enumerate(self.ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            step = Q(**{f"{field.attname}__{lookup}": values[index]})
+            for (prev_field, _), value in zip(self.ordering, values[:index]):
+                step &= Q(**{prev_field.attname: value})
+            condition |= step
+        return condition
+
+    def _position(self, obj):
+        return [getattr(obj, field.attname) for field, _ in self.ordering]
+
+    def _parse(self, cursor):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return None, False
+        values, reverse = decoded
+        if len(values) != len(self.ordering):
+            return None, False
+        try:
+            values = [
+                field.to_python(value)
+                for (field, _), value in zip(self.ordering, values)
+            ]
+        except ValidationError:
+            return None, False
+        return values, reverse
+
+    def page(self, cursor=None):
+        """Возвращает страницу, следующую за позицией из курсора.
+
+        Пустой или испорченный курсор означает первую страницу.
+        """
+
+        values, reverse = self._parse(cursor)
+        queryset = self.object_list.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        if reverse:
+            # Пришли со следующей страницы - значит, дальше записи есть.
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor, previous_cursor = self.cursors(
+            rows, has_next, has_previous
+        )
+        return CursorPage(rows, self, cursor, next_cursor, previous_cursor)
+
+    def cursors(self, rows, has_next, has_previous):
+        """Курсоры страниц после и перед строками rows (или None)."""
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._position(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(
+                self._position(rows[0]), reverse=True
+            )
+        return next_cursor, previous_cursor
+
+
+def batches(iterable, size):
+    """Разбивает итерируемое на списки не длиннее size, не читая его
+    целиком.
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def cached_count(key, queryset):
+    """Число записей в выборке; при промахе считается и кладется в кэш."""
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.add(key, count, FEED_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_count(key, delta):
+    """Сдвигает закэшированный счетчик на delta.
+
+    Отсутствующий ключ не создается: его посчитает следующий cached_count.
+    """
+
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        elif delta < 0:
+            cache.decr(key, -delta)
+    except ValueError:
+        pass
+
+
+class CachedCountPaginator(Paginator):
+    """Паджинатор, берущий общее число записей из кэша по ключу."""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.count_key, self.object_list)
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы выборки без COUNT(*) или None.
+
+    В PostgreSQL это статистика планировщика, в SQLite - наибольший
+    первичный ключ (дыры от удаленных строк дают завышение).
+    """
+
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s",
+                (model._meta.db_table,),
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    auto_pk = model._meta.pk.get_internal_type() in (
+        "AutoField",
+        "BigAutoField",
+    )
+    if connection.vendor == "sqlite" and auto_pk:
+        return (
+            model._default_manager.using(queryset.db)
+            .aggregate(last=Max("pk"))["last"] or 0
+        )
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Паджинатор, который для выборки без фильтров берет оценку числа
+    строк (см. ``estimate_count``) вместо COUNT(*) по всей таблице.
+
+    Маленькие таблицы и выборки с фильтрами считаются точно. Оценка
+    бывает завышена, и последние страницы по ней пусты: такая страница
+    заменяется последней непустой по точному числу строк.
+    """
+
+    exact_below = 10000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate >= self.exact_below:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if not self.estimated or len(page) or page.number == 1:
+            return page
+        self.estimated = False
+        self.__dict__["count"] = self.object_list.count()
+        self.__dict__.pop("num_pages", None)
+        return super().page(min(page.number, self.num_pages))
+
+
+def paginate(
+    request, posts, pagesize=POSTS_PER_PAGE, keyset=False, count_key=None
+):
+    """Паджинатор - разбивка на страницы.
 
-from yatube.settings import POSTS_PER_PAGE
+    При ``keyset=True`` или наличии ``?cursor=`` в запросе страница
+    выбирается по курсору (см. ``CursorPaginator``): время ответа не растет
+    с глубиной пролистывания, а ``COUNT(*)`` не выполняется.
+    С ``count_key`` общее число записей берется из кэша
+    (см. ``CachedCountPaginator``).
 
+    Страница по номеру тоже получает ``next_cursor`` и
+    ``previous_cursor``: ссылки «Следующая» и «Предыдущая» ведут дальше
+    по курсору, и глубже в ленту читатель уходит без OFFSET.
+    """
 
-def paginate(request, posts, pagesize=POSTS_PER_PAGE):
-    """Паджинатор - разбивка на страницы."""
-    paginator = Paginator(posts, pagesize)
-    page_number = request.GET.get("page")
-    return paginator.get_page(page_number)
+    if keyset or CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(posts, pagesize)
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+    if count_key is None:
+        paginator = Paginator(posts, pagesize)
+    else:
+        paginator = CachedCountPaginator(posts, pagesize, count_key)
+    page = paginator.get_page(request.GET.get("page"))
+    page.object_list = list(page.object_list)
+    page.next_cursor, page.previous_cursor = CursorPaginator(
+        posts, pagesize
+    ).cursors(page.object_list, page.has_next(), page.has_previous())
+    return page
@@ -1,30 +1,109 @@
+from datetime import date, datetime, timedelta
+
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
 
+from core.utils import EstimatedCountPaginator
 from .models import Comment, Follow, Group, Post
+from .search import search_posts
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Общие настройки списков больших таблиц.
+
+    Общее число строк оценивается (``EstimatedCountPaginator``), а второй
+    COUNT(*) для подписи «из N» не выполняется.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class DateRangeQuerySet(QuerySet):
+    """``dates()`` для ``date_hierarchy`` без DISTINCT по всей таблице.
 
+    Берет из индекса только первую и последнюю дату и перечисляет все
+    периоды между ними, в том числе пустые.
+    """
 
-class PostAdmin(admin.ModelAdmin):
+    def dates(self, field_name, kind, order="ASC"):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        first, last = (
+            timezone.localtime(value).date()
+            if isinstance(value, datetime)
+            else value
+            for value in (bounds["first"], bounds["last"])
+        )
+        if kind == "year":
+            periods = [
+                date(year, 1, 1) for year in range(first.year, last.year + 1)
+            ]
+        elif kind == "month":
+            periods = [
+                date(month // 12, month % 12 + 1, 1)
+                for month in range(
+                    first.year * 12 + first.month - 1,
+                    last.year * 12 + last.month,
+                )
+            ]
+        else:
+            periods = [
+                first + timedelta(days=day)
+                for day in range((last - first).days + 1)
+            ]
+        return periods if order == "ASC" else periods[::-1]
+
+
+class DateRangeChangeList(ChangeList):
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateRangeQuerySet(
+            queryset.model, queryset.query, using=queryset.db
+        )
+
+
+class PostAdmin(ScalableAdmin):
     list_display = ("pk", "text", "pub_date", "author", "group")
-    list_editable = ("group",)
+    list_select_related = ("author", "group")
+    autocomplete_fields = ("author", "group")
     search_fields = ("text",)
     list_filter = ("pub_date",)
+    date_hierarchy = "pub_date"
     empty_value_display = "-пусто-"
 
+    def get_changelist(self, request, **kwargs):
+        return DateRangeChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE '%...%'."""
+
+        if not search_term:
+            return queryset, False
+        return search_posts(search_term, queryset), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "description", "slug")
     search_fields = ("title",)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ("pk", "text", "created", "post", "author")
+    list_select_related = ("post", "author")
+    autocomplete_fields = ("post", "author")
     search_fields = ("text",)
     list_filter = ("created",)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ("pk", "user", "author")
-    search_fields = ("user",)
+    list_select_related = ("user", "author")
+    autocomplete_fields = ("user", "author")
+    search_fields = ("=user__username", "=author__username")
 
 
 admin.site.register(Post, PostAdmin)
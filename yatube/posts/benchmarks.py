@@ -0,0 +1,195 @@
+"""Замеры скорости страниц постов в процессе, через тестовый клиент.
+
+Каждый адрес ``posts/urls.py`` описан сценарием. Сценарии проходятся
+по кругу (подписка идет перед отпиской, создание поста - перед его
+правкой), для каждого запроса записываются время, число запросов к базе
+и размер ответа.
+"""
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Group, Post, User
+
+DATASET_SIZES = {
+    "users": 200,
+    "groups": 10,
+    "posts": 2000,
+    "comments": 4000,
+    "follows": 2000,
+}
+PERCENTILES = (50, 95, 99)
+
+
+def build_dataset(sizes=None, seed=0):
+    """Заполняет базу командой seed; одинаковые ``sizes`` и ``seed`` дают
+    одинаковые данные.
+    """
+
+    sizes = {**DATASET_SIZES, **(sizes or {})}
+    call_command("seed", **sizes, seed=seed, stdout=StringIO())
+    return sizes
+
+
+class Scenario:
+    """Запрос к одному адресу: имя, метод, адрес и данные формы."""
+
+    def __init__(self, name, url, method="get", data=None):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data or {}
+
+    def __repr__(self):
+        return f"<Scenario {self.name}>"
+
+
+def scenarios():
+    """Сценарии для всех адресов приложения posts.
+
+    Пользователь с самым большим числом подписок смотрит ленты самого
+    плодовитого автора; подписывается он на нового автора, правит
+    собственный пост.
+    """
+
+    user = User.objects.order_by("-stats__following_count", "pk").first()
+    author = User.objects.order_by("-stats__posts_count", "pk").first()
+    group = Group.objects.order_by("-posts_count", "pk").first()
+    post = author.posts.first()
+    own_post = Post.objects.create(author=user, text="Пост для правки")
+    target = User.objects.create_user(username="benchmark_target")
+    Post.objects.create(author=target, text="Пост нового автора")
+    post_args = (post.pk,)
+    return user, [
+        Scenario("index", reverse("posts:index")),
+        Scenario(
+            "group_list", reverse("posts:group_list", args=(group.slug,))
+        ),
+        Scenario("profile", reverse("posts:profile", args=(author.username,))),
+        Scenario("post_detail", reverse("posts:post_detail", args=post_args)),
+        Scenario(
+            "post_comments", reverse("posts:post_comments", args=post_args)
+        ),
+        Scenario(
+            "search", reverse("posts:search") + f"?q={post.text.split()[0]}"
+        ),
+        Scenario(
+            "export", reverse("posts:export", args=(user.username, "posts"))
+        ),
+        Scenario("post_create", reverse("posts:post_create")),
+        Scenario(
+            "post_create:post",
+            reverse("posts:post_create"),
+            "post",
+            {"text": "Новый пост"},
+        ),
+        Scenario("post_edit", reverse("posts:post_edit", args=(own_post.pk,))),
+        Scenario(
+            "post_edit:post",
+            reverse("posts:post_edit", args=(own_post.pk,)),
+            "post",
+            {"text": "Исправленный пост"},
+        ),
+        Scenario(
+            "add_comment",
+            reverse("posts:add_comment", args=post_args),
+            "post",
+            {"text": "Комментарий"},
+        ),
+        Scenario("follow_index", reverse("posts:follow_index")),
+        Scenario(
+            "profile_follow",
+            reverse("posts:profile_follow", args=(target.username,)),
+        ),
+        Scenario(
+            "profile_unfollow",
+            reverse("posts:profile_unfollow", args=(target.username,)),
+        ),
+    ]
+
+
+def measure(client, scenario):
+    """Время, число запросов к базе, размер и статус одного ответа."""
+
+    request = getattr(client, scenario.method)
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = request(scenario.url, scenario.data)
+        if response.streaming:
+            size = sum(map(len, response.streaming_content))
+        else:
+            size = len(response.content)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(queries), size, response.status_code
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    times = [elapsed * 1000 for elapsed, *_ in samples]
+    summary = {
+        f"p{percent}_ms": round(percentile(times, percent), 3)
+        for percent in PERCENTILES
+    }
+    summary.update(
+        requests=len(samples),
+        mean_ms=round(sum(times) / len(times), 3),
+        queries=max(queries for _, queries, _, _ in samples),
+        bytes=max(size for _, _, size, _ in samples),
+        errors=sum(status >= 400 for *_, status in samples),
+    )
+    return summary
+
+
+def run(requests=50, warmup=5):
+    """Проходит все сценарии requests раз после warmup прогонов.
+
+    Возвращает сводку по сценариям: перцентили времени в миллисекундах,
+    наибольшие число запросов и размер ответа, число ошибок.
+    """
+
+    user, plan = scenarios()
+    client = Client()
+    client.force_login(user)
+    cache.clear()
+    samples = {scenario.name: [] for scenario in plan}
+    for iteration in range(warmup + requests):
+        for scenario in plan:
+            result = measure(client, scenario)
+            if iteration >= warmup:
+                samples[scenario.name].append(result)
+    return {name: summarize(rows) for name, rows in samples.items()}
+
+
+def compare(results, baseline, threshold=1.2):
+    """Регрессии относительно прошлых результатов: p95 выросло больше чем
+    в threshold раз или запросов к базе стало больше.
+    """
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * threshold:
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс"
+            )
+        if current["queries"] > previous["queries"]:
+            regressions.append(
+                f"{name}: запросов {previous['queries']} -> "
+                f"{current['queries']}"
+            )
+    return regressions
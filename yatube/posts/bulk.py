@@ -0,0 +1,106 @@
+"""Помощники массовой записи в обход сигналов моделей.
+
+Команды bulk_import и seed сами выдают первичные ключи (bulk_create
+в SQLite их не возвращает), сохраняют даты из источника и после записи
+один раз пересчитывают то, что при обычном save() делают сигналы.
+"""
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+
+from core.utils import PARAMS_PER_QUERY, batches
+from .feeds import FEED_ALL, bump_feed_version
+from .models import Comment, Follow, Group, Post, User
+
+FILL_INBOX = (
+    "INSERT INTO posts_inbox (user_id, post_id, author_id, pub_date) "
+    "SELECT f.user_id, p.id, p.author_id, p.pub_date "
+    "FROM posts_follow f JOIN posts_post p ON p.author_id = f.author_id "
+    "WHERE f.author_id IN ({authors}) AND NOT EXISTS ("
+    "SELECT 1 FROM posts_inbox i "
+    "WHERE i.user_id = f.user_id AND i.post_id = p.id)"
+)
+
+BACKFILL_INBOX = (
+    "INSERT INTO posts_inbox (user_id, post_id, author_id, pub_date) "
+    "SELECT %s, p.id, p.author_id, p.pub_date FROM posts_post p "
+    "WHERE p.author_id = %s AND NOT EXISTS ("
+    "SELECT 1 FROM posts_inbox i WHERE i.user_id = %s AND i.post_id = p.id)"
+)
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+
+@contextmanager
+def keep_dates():
+    """Отключает auto_now_add дат постов и комментариев, чтобы сохранить
+    даты из источника.
+    """
+
+    fields = (
+        Post._meta.get_field("pub_date"),
+        Comment._meta.get_field("created"),
+    )
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def reset_sequences():
+    """Id выдавались явно, поэтому последовательности базы отстали."""
+
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Group, Post, Comment, Follow]
+    )
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def fill_inbox(author_ids):
+    """Раскладывает посты авторов в ленты их подписчиков.
+
+    Записи собираются в базе одним INSERT ... SELECT на пачку авторов,
+    без передачи строк через Python; уже разложенные пропускаются.
+    Возвращает число добавленных записей.
+    """
+
+    added = 0
+    with connection.cursor() as cursor:
+        for batch in batches(author_ids, PARAMS_PER_QUERY):
+            sql = FILL_INBOX.format(authors=", ".join(["%s"] * len(batch)))
+            cursor.execute(sql, batch)
+            added += max(cursor.rowcount, 0)
+    return added
+
+
+def fill_follower_inbox(user_id, author_id):
+    """Раскладывает посты автора в ленту нового подписчика одним
+    INSERT ... SELECT и возвращает число действительно добавленных
+    записей: уже разложенные пропускаются.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(BACKFILL_INBOX, (user_id, author_id, user_id))
+        return max(cursor.rowcount, 0)
+
+
+def finish_bulk_write(feeds, stdout):
+    """Пересчитывает счетчики и делает устаревшими ленты feeds
+    (и общую ленту) вместе с их закэшированными счетчиками.
+    """
+
+    reset_sequences()
+    call_command("rebuild_counters", stdout=stdout)
+    for feed in {(FEED_ALL, ""), *feeds}:
+        bump_feed_version(*feed)
+    call_command("reconcile_feed_counts", stdout=stdout)
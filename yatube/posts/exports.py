@@ -0,0 +1,81 @@
+"""Выгрузка постов и комментариев автора потоком строк NDJSON или CSV.
+
+Строки читаются из базы пачками по первичному ключу (``id > последний``),
+так что память не зависит от числа записей, а первые байты уходят
+клиенту сразу после первой пачки.
+"""
+import csv
+import json
+
+from django.conf import settings
+
+EXPORT_FIELDS = {
+    "posts": (
+        "id", "pub_date", "group__slug", "text", "image", "comments_count"
+    ),
+    "comments": ("id", "created", "post_id", "text"),
+}
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def keyset_rows(queryset, fields, chunk_size=None):
+    """Значения полей выборки по возрастанию id, пачками по chunk_size.
+
+    Каждая пачка - отдельный запрос, выбирающий строки после последнего
+    id предыдущей; ``iterator()`` не копит пачку в кэше выборки.
+    """
+
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    rows = queryset.order_by("pk").values_list("pk", *fields)
+    last = None
+    while True:
+        chunk = rows if last is None else rows.filter(pk__gt=last)
+        count = 0
+        for pk, *values in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last = pk
+            yield values
+        if count < chunk_size:
+            return
+
+
+def _value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def ndjson_lines(rows, fields):
+    names = [field.replace("__", "_") for field in fields]
+    for row in rows:
+        record = dict(zip(names, map(_value, row)))
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class _Line:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Line())
+    yield writer.writerow([field.replace("__", "_") for field in fields])
+    for row in rows:
+        yield writer.writerow(
+            ["" if value is None else _value(value) for value in row]
+        )
+
+
+def export_lines(author, kind, fmt):
+    """Строки выгрузки ``kind`` ("posts" или "comments") автора."""
+
+    fields = EXPORT_FIELDS[kind]
+    rows = keyset_rows(getattr(author, kind).all(), fields)
+    if fmt == "csv":
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows, fields)
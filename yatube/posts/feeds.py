@@ -0,0 +1,123 @@
+"""Ключи кэша для лент постов."""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from .models import Group, Post, User
+
+FEED_ALL = "all"
+FEED_GROUP = "group"
+FEED_AUTHOR = "author"
+FEED_FOLLOW = "follow"
+FEED_POST = "post"
+
+
+def feed_count_key(feed, pk=""):
+    """Ключ закэшированного числа постов в ленте."""
+
+    return f"feed_count:{feed}:{pk}"
+
+
+def feed_version_key(feed, pk=""):
+    return f"feed_version:{feed}:{pk}"
+
+
+def feed_version(feed, pk=""):
+    """Текущая версия ленты: меняется при каждой записи в нее."""
+
+    key = feed_version_key(feed, pk)
+    version = cache.get(key)
+    if version is None:
+        # Начинаем со времени, чтобы после вытеснения ключа новая версия
+        # не совпала со старой, под которой еще лежат страницы.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_feed_version(feed, pk=""):
+    """Делает устаревшими все закэшированные страницы ленты."""
+
+    key = feed_version_key(feed, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def index_version(request):
+    return feed_version(FEED_ALL)
+
+
+def group_version(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list("pk", flat=True).first()
+    )
+    if group_id is None:
+        return None
+    return feed_version(FEED_GROUP, group_id)
+
+
+def _etag(request, *versions, form=False):
+    """Валидатор страницы: версии ее данных, пользователь и параметры
+    страницы.
+
+    CSRF-cookie входит в валидатор только у страниц с формой (``form``)
+    для вошедшего пользователя: токен в форме должен совпадать с cookie.
+    Остальные страницы от токена не зависят, и их ETag общий для всех
+    анонимных посетителей.
+    """
+
+    if None in versions:
+        return None
+    parts = [*versions, request.user.pk, request.GET.urlencode()]
+    if form and request.user.is_authenticated:
+        parts.append(request.META.get("CSRF_COOKIE", ""))
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, feed_version(FEED_ALL))
+
+
+def group_etag(request, slug):
+    return _etag(request, group_version(request, slug))
+
+
+def profile_etag(request, username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if author_id is None:
+        return None
+    return _etag(request, feed_version(FEED_AUTHOR, author_id))
+
+
+def follow_etag(request):
+    # Версия FEED_ALL меняется при любой записи в постах и комментариях,
+    # поэтому ленту подписок не нужно версионировать на каждого подписчика.
+    if not request.user.is_authenticated:
+        return None
+    return _etag(
+        request,
+        feed_version(FEED_ALL),
+        feed_version(FEED_FOLLOW, request.user.pk),
+    )
+
+
+def post_etag(request, post_id):
+    post = Post.objects.filter(pk=post_id).values("author_id", "group_id")
+    post = post.first()
+    if post is None:
+        return None
+    versions = [
+        feed_version(FEED_POST, post_id),
+        feed_version(FEED_AUTHOR, post["author_id"]),
+    ]
+    if post["group_id"] is not None:
+        versions.append(feed_version(FEED_GROUP, post["group_id"]))
+    # Вошедшему пользователю страница поста показывает форму комментария.
+    return _etag(request, *versions, form=True)
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from core.uploads import check_image, check_size
 from .models import Comment, Post
 
 
@@ -10,6 +12,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ("text", "group", "image")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Слишком большой файл записан не целиком: не отдаем его Pillow.
+        self.oversized_image = None
+        image = self.files.get("image") if self.files else None
+        if image is not None:
+            try:
+                check_size(image)
+            except forms.ValidationError as error:
+                self.oversized_image = error
+                self.files = {
+                    name: self.files[name]
+                    for name in self.files
+                    if name != "image"
+                }
+
+    def clean_image(self):
+        if self.oversized_image is not None:
+            raise self.oversized_image
+        image = self.cleaned_data["image"]
+        if isinstance(image, UploadedFile):
+            check_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Форма добавления комментария."""
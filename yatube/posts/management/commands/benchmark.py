@@ -0,0 +1,123 @@
+import json
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts.benchmarks import DATASET_SIZES, build_dataset, compare, run
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет страницы приложения posts на отдельной тестовой базе "
+        "с набором данных заданного размера: перцентили времени ответа, "
+        "запросы к базе и размер ответа. Результаты пишутся в JSON и "
+        "сравниваются с прошлыми."
+    )
+
+    def add_arguments(self, parser):
+        for kind, size in DATASET_SIZES.items():
+            parser.add_argument(
+                f"--{kind}",
+                type=int,
+                default=size,
+                help=f"Размер набора данных (по умолчанию {size}).",
+            )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="Замеряемых запросов на адрес.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Незамеряемых прогонов перед замером.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", metavar="PATH", help="Файл для результатов в JSON."
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="PATH",
+            help="Прошлые результаты; регрессии завершают команду ошибкой.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="Во сколько раз может вырасти p95 без ошибки.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = {kind: options[kind] for kind in DATASET_SIZES}
+        baseline = None
+        if options["baseline"]:
+            # Читается заранее: --output может указывать на тот же файл.
+            with open(options["baseline"], encoding="utf-8") as source:
+                baseline = json.load(source)["scenarios"]
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            build_dataset(sizes, options["seed"])
+            results = run(options["requests"], options["warmup"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as target:
+                json.dump(
+                    {
+                        "commit": current_commit(),
+                        "django": django.get_version(),
+                        "dataset": sizes,
+                        "seed": options["seed"],
+                        "scenarios": results,
+                    },
+                    target,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+        if baseline is not None:
+            self.check_baseline(results, baseline, options["threshold"])
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'адрес':<20}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'запросов':>10}{'байт':>10}{'ошибок':>8}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<20}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+                f"{row['p99_ms']:>9.2f}{row['queries']:>10}"
+                f"{row['bytes']:>10}{row['errors']:>8}"
+            )
+
+    def check_baseline(self, results, baseline, threshold):
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            raise CommandError(
+                "Регрессии производительности:\n" + "\n".join(regressions)
+            )
+        self.stdout.write("Регрессий нет")
@@ -0,0 +1,400 @@
+import csv
+import json
+import os
+from datetime import datetime, time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date as parse_day
+from django.utils.dateparse import parse_datetime
+
+from core.utils import batches
+from posts.bulk import fill_inbox, finish_bulk_write, keep_dates, next_pk
+from posts.feeds import FEED_AUTHOR, FEED_FOLLOW, FEED_GROUP, FEED_POST
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+
+# Порядок важен: записи ссылаются на импортированные раньше.
+KINDS = ("users", "groups", "posts", "comments", "follows")
+MODELS = {
+    "users": User,
+    "groups": Group,
+    "posts": Post,
+    "comments": Comment,
+    "follows": Follow,
+}
+NAMES = {
+    "users": "пользователей",
+    "groups": "групп",
+    "posts": "постов",
+    "comments": "комментариев",
+    "follows": "подписок",
+}
+
+
+def read_records(path):
+    """Записи файла потоком: CSV с заголовком или NDJSON."""
+
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_date(value):
+    """Дата из файла (можно без времени); без часового пояса считается
+    в TIME_ZONE.
+    """
+
+    if not value:
+        return timezone.now()
+    try:
+        date = parse_datetime(str(value))
+        day = parse_day(str(value)) if date is None else None
+    except ValueError:
+        date = day = None
+    if day is not None:
+        date = datetime.combine(day, time())
+    if date is None:
+        raise CommandError(f"Неверная дата: {value!r}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Checkpoint:
+    """Журнал импорта: строка NDJSON на каждую записанную пачку.
+
+    В строке - сколько записей файла обработано, соответствие старых id
+    новым, ленты, которые задела пачка, и id последнего вставленного
+    объекта. При повторном запуске журнал читается целиком, и импорт
+    продолжается с места остановки.
+
+    Строка пишется внутри транзакции пачки, до ее фиксации. Если сбой
+    случился между ними, последнего объекта в базе нет: такая строка
+    (как и недописанная) отбрасывается, и пачка импортируется заново.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = dict.fromkeys(KINDS, 0)
+        self.ids = {kind: {} for kind in KINDS}
+        self.feeds = set()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        entries = []
+        # Длина журнала до начала каждой строки.
+        starts = []
+        size = 0
+        with open(self.path, "rb") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                entries.append(entry)
+                starts.append(size)
+                size += len(line)
+        if entries and not self.committed(entries[-1]):
+            entries.pop()
+            size = starts.pop()
+        os.truncate(self.path, size)
+        for entry in entries:
+            self.apply(entry)
+
+    def committed(self, entry):
+        # Пачка без новых объектов ничего не записывает в базу.
+        last = entry.get("last")
+        return last is None or (
+            MODELS[entry["kind"]].objects.filter(pk=last).exists()
+        )
+
+    def apply(self, entry):
+        kind = entry["kind"]
+        self.positions[kind] = entry["position"]
+        self.ids[kind].update(entry["ids"])
+        self.feeds.update(tuple(feed) for feed in entry["feeds"])
+
+    def record(self, kind, position, ids, feeds, last=None):
+        entry = {
+            "kind": kind,
+            "position": position,
+            "ids": ids,
+            "feeds": sorted(feeds, key=str),
+            "last": last,
+        }
+        self.apply(entry)
+        if not self.path:
+            return
+        with open(self.path, "a", encoding="utf-8") as log:
+            log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует пользователей, группы, посты, комментарии и подписки "
+        "из NDJSON или CSV. Файлы читаются потоком, записи вставляются "
+        "пачками через bulk_create, ссылки переводятся на новые id через "
+        "словари в памяти. Счетчики, ленты подписок и кэш лент "
+        "пересчитываются один раз в конце."
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(
+                f"--{kind}",
+                metavar="PATH",
+                help=f"Файл {NAMES[kind]} (.csv или NDJSON).",
+            )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Записей в одной транзакции.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            metavar="PATH",
+            help=(
+                "Журнал импорта. Если он есть, импорт продолжается "
+                "с последней записанной пачки."
+            ),
+        )
+
+    def handle(self, *args, batch_size, checkpoint, **options):
+        self.verbosity = options["verbosity"]
+        self.checkpoint = Checkpoint(checkpoint)
+        self.skipped = 0
+        imported = {}
+        with keep_dates():
+            for kind in KINDS:
+                if options[kind]:
+                    imported[kind] = self.import_file(
+                        kind, options[kind], batch_size
+                    )
+        self.finish()
+        totals = ", ".join(
+            f"{NAMES[kind]} {count}" for kind, count in imported.items()
+        )
+        self.stdout.write(
+            f"Импортировано: {totals or 'ничего'} "
+            f"(пропущено {self.skipped})"
+        )
+
+    def import_file(self, kind, path, batch_size):
+        position = self.checkpoint.positions[kind]
+        records = islice(read_records(path), position, None)
+        build = getattr(self, f"build_{kind}")
+        imported = 0
+        for batch in batches(records, batch_size):
+            position += len(batch)
+            with transaction.atomic():
+                try:
+                    objects, ids, feeds = build(batch)
+                except KeyError as error:
+                    raise CommandError(
+                        f"{path}: в записи до {position} нет поля {error}"
+                    )
+                model = MODELS[kind]
+                if objects:
+                    model.objects.bulk_create(
+                        objects, ignore_conflicts=model is Follow
+                    )
+                last = objects[-1].pk if objects else None
+                self.checkpoint.record(kind, position, ids, feeds, last)
+            imported += len(objects)
+            if self.verbosity > 1:
+                self.stdout.write(f"{NAMES[kind]}: {position}")
+        return imported
+
+    def resolve(self, kind, record, field):
+        """Новый id записи, на которую ссылается поле, или None."""
+
+        value = record.get(field)
+        if value in (None, ""):
+            return None
+        return self.checkpoint.ids[kind].get(str(value))
+
+    def skip(self, record, reason):
+        self.skipped += 1
+        if self.verbosity > 1:
+            self.stderr.write(f"Пропущено ({reason}): {record}")
+
+    def build_by_key(self, model, key, batch, make):
+        """Новые объекты для записей, чьего ключа key еще нет в базе.
+
+        Записи с уже известным ключом связываются с существующими
+        объектами, так что повтор пачки не создает дублей.
+        """
+
+        existing = dict(
+            model.objects.filter(
+                **{f"{key}__in": [record[key] for record in batch]}
+            ).values_list(key, "pk")
+        )
+        pk = next_pk(model)
+        objects = []
+        ids = {}
+        for record in batch:
+            value = record[key]
+            if value not in existing:
+                existing[value] = pk
+                objects.append(make(record, pk))
+                pk += 1
+            ids[str(record["id"])] = existing[value]
+        return objects, ids, set()
+
+    def build_users(self, batch):
+        return self.build_by_key(
+            User,
+            "username",
+            batch,
+            lambda record, pk: User(
+                pk=pk,
+                username=record["username"],
+                email=record.get("email") or "",
+                first_name=record.get("first_name") or "",
+                last_name=record.get("last_name") or "",
+                # Хэш из старой системы, если Django его понимает.
+                password=record.get("password") or make_password(None),
+                date_joined=parse_date(record.get("date_joined")),
+            ),
+        )
+
+    def build_groups(self, batch):
+        return self.build_by_key(
+            Group,
+            "slug",
+            batch,
+            lambda record, pk: Group(
+                pk=pk,
+                slug=record["slug"],
+                title=record["title"],
+                description=record.get("description") or "",
+            ),
+        )
+
+    def build_posts(self, batch):
+        pk = next_pk(Post)
+        objects = []
+        ids = {}
+        feeds = set()
+        for record in batch:
+            author_id = self.resolve("users", record, "author")
+            group_id = self.resolve("groups", record, "group")
+            if author_id is None or record.get("group") and group_id is None:
+                self.skip(record, "нет автора или группы")
+                continue
+            objects.append(
+                Post(
+                    pk=pk,
+                    text=record["text"],
+                    author_id=author_id,
+                    group_id=group_id,
+                    image=record.get("image") or "",
+                    pub_date=parse_date(record.get("pub_date")),
+                )
+            )
+            ids[str(record["id"])] = pk
+            pk += 1
+            feeds.add((FEED_AUTHOR, author_id))
+            if group_id is not None:
+                feeds.add((FEED_GROUP, group_id))
+        return objects, ids, feeds
+
+    def build_comments(self, batch):
+        pk = next_pk(Comment)
+        objects = []
+        for record in batch:
+            post_id = self.resolve("posts", record, "post")
+            author_id = self.resolve("users", record, "author")
+            if post_id is None or author_id is None:
+                self.skip(record, "нет поста или автора")
+                continue
+            objects.append(
+                Comment(
+                    pk=pk,
+                    text=record["text"],
+                    post_id=post_id,
+                    author_id=author_id,
+                    created=parse_date(record.get("created")),
+                )
+            )
+            pk += 1
+        # Комментарий меняет страницу поста и ленты, где пост показан.
+        feeds = set()
+        for post_id, author_id, group_id in Post.objects.filter(
+            pk__in={comment.post_id for comment in objects}
+        ).values_list("pk", "author_id", "group_id"):
+            feeds.update(((FEED_POST, post_id), (FEED_AUTHOR, author_id)))
+            if group_id is not None:
+                feeds.add((FEED_GROUP, group_id))
+        return objects, {}, feeds
+
+    def build_follows(self, batch):
+        """Подписки, которых еще нет в базе и в пачке.
+
+        Каждой новой подписке назначается id: по последнему журнал
+        проверяет, зафиксирована ли пачка.
+        """
+
+        pairs = [
+            (
+                self.resolve("users", record, "user"),
+                self.resolve("users", record, "author"),
+            )
+            for record in batch
+        ]
+        existing = set(
+            Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs}
+            ).values_list("user_id", "author_id")
+        )
+        pk = next_pk(Follow)
+        objects = []
+        feeds = set()
+        for record, (user_id, author_id) in zip(batch, pairs):
+            if user_id is None or author_id is None:
+                self.skip(record, "нет подписчика или автора")
+                continue
+            if user_id == author_id:
+                self.skip(record, "подписка на себя")
+                continue
+            if (user_id, author_id) in existing:
+                continue
+            existing.add((user_id, author_id))
+            objects.append(Follow(pk=pk, user_id=user_id, author_id=author_id))
+            pk += 1
+            feeds.update(
+                (
+                    (FEED_FOLLOW, user_id),
+                    (FEED_AUTHOR, user_id),
+                    (FEED_AUTHOR, author_id),
+                )
+            )
+        return objects, {}, feeds
+
+    def finish(self):
+        """Один раз после всех пачек приводит в порядок то, что при
+        обычной записи делают сигналы.
+        """
+
+        fill_inbox(
+            sorted(
+                pk
+                for feed, pk in self.checkpoint.feeds
+                if feed == FEED_AUTHOR
+            )
+        )
+        finish_bulk_write(self.checkpoint.feeds, self.stdout)
@@ -0,0 +1,201 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.storage import post_images
+from core.utils import PARAMS_PER_QUERY, batches
+from posts.models import Post
+from posts.thumbnails import delete_image
+
+
+class KeyRef:
+    """Ссылка на запись хранилища миниатюр, от которой остался только ключ.
+
+    Методам хранилища для удаления записи нужен только ``key``.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки постов, на которые не ссылается ни один пост, "
+        "их миниатюры и мертвые записи хранилища миниатюр. Файлы и записи "
+        "обходятся потоком и сверяются с базой пачками, поэтому память "
+        "не растет с их числом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет удалено.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help=(
+                "Не трогать файлы моложе стольких секунд: их пост может "
+                "быть еще не сохранен."
+            ),
+        )
+
+    def handle(self, *args, dry_run, min_age, **options):
+        self.dry_run = dry_run
+        self.verbose = options["verbosity"] > 1
+        self.min_age = min_age
+        self.deadline = time.time() - min_age
+        upload_to = Post._meta.get_field("image").upload_to
+        images = self.collect_images(upload_to)
+        entries = self.collect_entries()
+        thumbnails = self.collect_thumbnails(
+            thumbnail_settings.THUMBNAIL_PREFIX
+        )
+        verb = "Будет удалено" if dry_run else "Удалено"
+        self.stdout.write(
+            f"{verb}: картинок {images}, записей миниатюр {entries}, "
+            f"файлов миниатюр {thumbnails}"
+        )
+
+    def report(self, kind, name):
+        if self.verbose or self.dry_run:
+            self.stdout.write(f"{kind}: {name}")
+
+    def walk(self, storage, directory):
+        """Имена файлов каталога хранилища, старше --min-age, потоком."""
+
+        root = storage.location
+        stack = [os.path.join(root, directory)]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.stat().st_mtime < self.deadline:
+                        name = os.path.relpath(entry.path, root)
+                        yield name.replace(os.sep, "/")
+
+    def referenced(self, names):
+        return set(
+            Post.objects.filter(image__in=names).values_list(
+                "image", flat=True
+            )
+        )
+
+    def collect_images(self, directory):
+        """Картинки без постов - вместе с миниатюрами и их записями."""
+
+        removed = 0
+        for names in batches(
+            self.walk(post_images, directory), PARAMS_PER_QUERY
+        ):
+            referenced = self.referenced(names)
+            for name in names:
+                if name in referenced or not self.remove_image(name):
+                    continue
+                removed += 1
+                self.report("Картинка", name)
+        return removed
+
+    def remove_image(self, name):
+        """Удаляет картинку, если на нее по-прежнему нет ссылок.
+
+        Пачку сверили с базой раньше, а с тех пор файл могли повторно
+        использовать (это обновляет его mtime) или сохранить пост с ним,
+        поэтому под блокировкой имени проверка повторяется.
+        """
+
+        if self.dry_run:
+            return True
+        with post_images.lock(name):
+            if (
+                post_images.recently_used(name, self.min_age)
+                or Post.objects.filter(image=name).exists()
+            ):
+                return False
+            delete_image(name)
+        return True
+
+    def entry_keys(self, prefix):
+        """Ключи записей хранилища миниатюр пачками, по возрастанию.
+
+        Пачки выбираются по последнему ключу, а не одним курсором: записи
+        удаляются, пока обход еще идет.
+        """
+
+        last = ""
+        while True:
+            batch = list(
+                KVStore.objects.filter(key__startswith=prefix, key__gt=last)
+                .order_by("key")
+                .values_list("key", flat=True)[:PARAMS_PER_QUERY]
+            )
+            if not batch:
+                return
+            last = batch[-1]
+            yield [del_prefix(key) for key in batch]
+
+    def collect_entries(self):
+        """Списки миниатюр в хранилище, чей исходник не принадлежит посту
+        и уже удален.
+
+        Такие записи остаются от картинок, удаленных мимо delete_image.
+        """
+
+        removed = 0
+        for batch in self.entry_keys(add_prefix("", identity="thumbnails")):
+            sources = {
+                del_prefix(key): deserialize_image_file(value).name
+                for key, value in KVStore.objects.filter(
+                    key__in=[add_prefix(key) for key in batch]
+                ).values_list("key", "value")
+            }
+            referenced = self.referenced(sources.values())
+            for key in batch:
+                name = sources.get(key)
+                if name in referenced or name and post_images.exists(name):
+                    # Файл без поста удаляет collect_images с учетом --min-age.
+                    continue
+                removed += 1
+                self.report("Миниатюры", name or key)
+                if not self.dry_run:
+                    default.kvstore.delete(KeyRef(key))
+        return removed
+
+    def collect_thumbnails(self, directory):
+        """Файлы миниатюр, о которых не знает хранилище миниатюр."""
+
+        storage = default.storage
+        removed = 0
+        for names in batches(
+            self.walk(storage, directory), PARAMS_PER_QUERY
+        ):
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in names
+            }
+            known = set(
+                KVStore.objects.filter(key__in=keys).values_list(
+                    "key", flat=True
+                )
+            )
+            for key, name in keys.items():
+                if key in known:
+                    continue
+                removed += 1
+                self.report("Файл миниатюры", name)
+                if not self.dry_run:
+                    storage.delete(name)
+        return removed
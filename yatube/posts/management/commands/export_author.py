@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exports import CONTENT_TYPES, EXPORT_FIELDS, export_lines
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает посты или комментарии автора в NDJSON или CSV потоком, "
+        "как страница выгрузки профиля."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument(
+            "--kind", choices=tuple(EXPORT_FIELDS), default="posts"
+        )
+        parser.add_argument(
+            "--format",
+            dest="fmt",
+            choices=tuple(CONTENT_TYPES),
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--output",
+            metavar="PATH",
+            help="Файл выгрузки; по умолчанию - стандартный вывод.",
+        )
+
+    def handle(self, *args, username, kind, fmt, output, **options):
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise CommandError(f"Нет пользователя {username}")
+        lines = export_lines(author, kind, fmt)
+        if output is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(output, "w", newline="", encoding="utf-8") as target:
+            target.writelines(lines)
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.utils import batches
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+BATCH_SIZE = 1000
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся через field на запись."""
+
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает денормализованные счетчики постов, комментариев "
+        "и подписок одним UPDATE на таблицу."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = self.create_missing_stats()
+            posts = Post.objects.update(
+                comments_count=count_of(Comment, "post")
+            )
+            groups = Group.objects.update(posts_count=count_of(Post, "group"))
+            users = UserStats.objects.update(
+                posts_count=count_of(Post, "author"),
+                followers_count=count_of(Follow, "author"),
+                following_count=count_of(Follow, "user"),
+            )
+        self.stdout.write(
+            f"Пересчитано: постов {posts}, групп {groups}, "
+            f"пользователей {users} (новых {created})"
+        )
+
+    def create_missing_stats(self):
+        missing = (
+            User.objects.filter(stats__isnull=True)
+            .values_list("pk", flat=True)
+            .iterator()
+        )
+        created = 0
+        for batch in batches(missing, BATCH_SIZE):
+            UserStats.objects.bulk_create(
+                (UserStats(user_id=pk) for pk in batch),
+                ignore_conflicts=True,
+            )
+            created += len(batch)
+        return created
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.utils import batches
+from posts.feeds import (FEED_ALL, FEED_AUTHOR, FEED_FOLLOW, FEED_GROUP,
+                         feed_count_key)
+from posts.models import Group, Post, User
+from yatube.settings import FEED_COUNT_TIMEOUT
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает закэшированные счетчики лент и исправляет "
+        "накопившееся расхождение с базой. Запускается по расписанию."
+    )
+
+    def handle(self, *args, **options):
+        fixed = self.reconcile([((FEED_ALL, ""), Post.objects.count())])
+        fixed += self.reconcile(
+            ((FEED_GROUP, pk), count)
+            for pk, count in Group.objects.annotate(n=Count("posts"))
+            .values_list("pk", "n")
+            .iterator()
+        )
+        fixed += self.reconcile(
+            ((FEED_AUTHOR, pk), count)
+            for pk, count in User.objects.annotate(n=Count("posts"))
+            .values_list("pk", "n")
+            .iterator()
+        )
+        fixed += self.reconcile(
+            ((FEED_FOLLOW, pk), count)
+            for pk, count in User.objects.annotate(n=Count("inbox"))
+            .values_list("pk", "n")
+            .iterator()
+        )
+        self.stdout.write(f"Исправлено счетчиков: {fixed}")
+
+    def reconcile(self, totals):
+        """Сверяет счетчики пачками и перезаписывает разошедшиеся.
+
+        Отсутствующие в кэше ключи не создаются.
+        """
+
+        fixed = 0
+        for pairs in batches(totals, BATCH_SIZE):
+            batch = {feed_count_key(*feed): count for feed, count in pairs}
+            cached = cache.get_many(batch)
+            stale = {
+                key: batch[key]
+                for key, value in cached.items()
+                if value != batch[key]
+            }
+            cache.set_many(stale, FEED_COUNT_TIMEOUT)
+            fixed += len(stale)
+        return fixed
@@ -0,0 +1,273 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from core.storage import post_images
+from posts.bulk import fill_inbox, finish_bulk_write, keep_dates, next_pk
+from posts.models import Comment, Follow, Group, Post, User
+
+# Даты постов заканчиваются здесь, а не в момент запуска: иначе одно
+# и то же зерно давало бы разные данные.
+UNTIL = datetime(2025, 1, 1, tzinfo=timezone.utc)
+WORDS = (
+    "мороз", "солнце", "день", "чудесный", "друг", "прелестный", "буря",
+    "мглою", "небо", "кроет", "вихри", "снежные", "крутя", "парус",
+    "одинокий", "белеет", "тумане", "море", "голубом", "ищет", "стране",
+    "далекой", "кинул", "краю", "родном", "играют", "волны", "ветер",
+    "свищет", "мачта", "гнется", "скрипит", "увы", "счастия", "бежит",
+    "лес", "роняет", "багряный", "свой", "убор", "сребрит", "поле",
+    "осень", "дом", "город", "река", "письмо", "дорога", "утро", "вечер",
+)
+IMAGE_VARIANTS = 16
+
+
+def power_law_rank(rng, n, alpha):
+    """Ранг от 0 до n-1 с вероятностью примерно 1 / (ранг + 1) ** alpha.
+
+    Обратное преобразование ограниченного распределения Парето: памяти
+    не нужно, сколько бы рангов ни было.
+    """
+
+    u = rng.random()
+    if alpha == 1:
+        x = (n + 1) ** u
+    else:
+        x = (1 - u * (1 - (n + 1) ** (1 - alpha))) ** (1 / (1 - alpha))
+    return min(int(x) - 1, n - 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, группами, постами, "
+        "комментариями и подписками. Число подписчиков и постов автора "
+        "подчиняется степенному закону; записи вставляются bulk_create "
+        "большими пачками. Одно и то же зерно дает одни и те же данные."
+    )
+
+    def add_arguments(self, parser):
+        sizes = (
+            ("users", 1000),
+            ("groups", 20),
+            ("posts", 10000),
+            ("comments", 20000),
+            ("follows", 20000),
+        )
+        for kind, size in sizes:
+            parser.add_argument(f"--{kind}", type=int, default=size)
+        parser.add_argument(
+            "--images",
+            type=float,
+            default=0,
+            help="Доля постов с картинкой, от 0 до 1.",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Показатель степенного закона: больше - сильнее перекос.",
+        )
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help=(
+                "Начало имен пользователей и адресов групп; для повторного "
+                "заполнения той же базы нужно другое."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 or options["groups"] < 1:
+            raise CommandError("Нужно хотя бы два пользователя и одна группа")
+        started = time.monotonic()
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        with keep_dates():
+            users = self.create_users()
+            groups = self.create_groups()
+            posts = self.create_posts(users, groups)
+            comments = self.create_comments(users, posts)
+            follows = self.create_follows(users)
+        inbox = fill_inbox(users)
+        finish_bulk_write((), self.stdout)
+        self.stdout.write(
+            f"Создано: пользователей {len(users)}, групп {len(groups)}, "
+            f"постов {len(posts)}, комментариев {comments}, подписок "
+            f"{follows}, записей лент {inbox} "
+            f"за {time.monotonic() - started:.1f} с"
+        )
+
+    def insert(self, model, objects):
+        """Вставляет объекты пачками по --batch-size в транзакциях."""
+
+        total = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                total += self.flush(model, batch)
+                batch = []
+        return total + self.flush(model, batch)
+
+    def flush(self, model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch, ignore_conflicts=model is Follow
+            )
+        return len(batch)
+
+    def create_users(self):
+        """Создает пользователей и возвращает их id.
+
+        Степенной закон выбирает из списка по рангу, а у авторов и у тех,
+        на кого подписываются, ранги независимые (``self.popular``):
+        иначе самый плодовитый автор был бы и самым читаемым, и его посты
+        заполнили бы ленты подписок почти целиком.
+        """
+
+        first = next_pk(User)
+        ids = list(range(first, first + self.options["users"]))
+        prefix = self.options["prefix"]
+        # Пароль непригоден для входа, так что он может быть общим.
+        password = make_password(None)
+        joined = UNTIL - timedelta(days=self.options["days"])
+        self.insert(
+            User,
+            (
+                User(
+                    pk=pk,
+                    username=f"{prefix}{pk - first}",
+                    password=password,
+                    date_joined=joined,
+                )
+                for pk in ids
+            ),
+        )
+        self.rng.shuffle(ids)
+        self.popular = self.rng.sample(ids, len(ids))
+        return ids
+
+    def create_groups(self):
+        first = next_pk(Group)
+        ids = list(range(first, first + self.options["groups"]))
+        prefix = self.options["prefix"]
+        self.insert(
+            Group,
+            (
+                Group(
+                    pk=pk,
+                    slug=f"{prefix}-{pk - first}",
+                    title=f"Группа {pk - first}",
+                    description=self.text(10),
+                )
+                for pk in ids
+            ),
+        )
+        return ids
+
+    def text(self, words):
+        return " ".join(self.rng.choices(WORDS, k=words)).capitalize()
+
+    def post_date(self, number):
+        """Дата поста number из count: id растут вместе с датами."""
+
+        span = timedelta(days=self.options["days"])
+        return UNTIL - span + span * number / self.options["posts"]
+
+    def create_posts(self, users, groups):
+        first = next_pk(Post)
+        ids = range(first, first + self.options["posts"])
+        images = self.create_images()
+        skew = self.options["skew"]
+
+        def make(number):
+            rank = power_law_rank(self.rng, len(users), skew)
+            group = power_law_rank(self.rng, len(groups), skew)
+            with_image = images and self.rng.random() < self.options["images"]
+            return Post(
+                pk=first + number,
+                author_id=users[rank],
+                # Примерно треть постов - вне групп.
+                group_id=groups[group] if self.rng.random() < 0.7 else None,
+                text=self.text(self.rng.randint(5, 80)),
+                image=self.rng.choice(images) if with_image else "",
+                pub_date=self.post_date(number),
+            )
+
+        self.insert(Post, (make(number) for number in range(len(ids))))
+        return ids
+
+    def create_images(self):
+        """Несколько картинок, которые посты делят между собой.
+
+        Хранилище раскладывает файлы по хэшу содержимого, так что
+        повторный запуск с тем же зерном файлов не добавляет.
+        """
+
+        if not self.options["images"]:
+            return []
+        names = []
+        for number in range(IMAGE_VARIANTS):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            content = BytesIO()
+            Image.new("RGB", (960, 540), color).save(content, "JPEG")
+            names.append(
+                post_images.save(
+                    f"posts/seed{number}.jpg", ContentFile(content.getvalue())
+                )
+            )
+        return names
+
+    def create_comments(self, users, posts):
+        """Комментарии чаще достаются свежим постам."""
+
+        skew = self.options["skew"]
+        first = posts.start
+
+        def make():
+            rank = power_law_rank(self.rng, len(posts), skew)
+            post_id = posts[-1] - rank
+            pub_date = self.post_date(post_id - first)
+            return Comment(
+                post_id=post_id,
+                author_id=self.rng.choice(users),
+                text=self.text(self.rng.randint(3, 30)),
+                created=pub_date + (UNTIL - pub_date) * self.rng.random(),
+            )
+
+        if not posts:
+            return 0
+        return self.insert(
+            Comment, (make() for _ in range(self.options["comments"]))
+        )
+
+    def create_follows(self, users):
+        """Подписчики распределены по авторам по степенному закону.
+
+        Повторные пары отбрасывает база (ignore_conflicts), поэтому
+        возвращается число действительно добавленных подписок.
+        """
+
+        skew = self.options["skew"]
+        before = Follow.objects.count()
+
+        def follows():
+            for _ in range(self.options["follows"]):
+                user = self.rng.choice(users)
+                rank = power_law_rank(self.rng, len(users), skew)
+                author = self.popular[rank]
+                if user != author:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.insert(Follow, follows())
+        return Follow.objects.count() - before
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import post_images
+
 User = get_user_model()
 
 
@@ -18,6 +20,9 @@ class Group(models.Model):
             "латиницу, цифры, дефисы и знаки подчёркивания"
         ),
     )
+    posts_count = models.PositiveIntegerField(
+        "Число постов", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Группа"
@@ -31,9 +36,7 @@ class Post(models.Model):
     """Модель для постов."""
 
     text = models.TextField("Текст поста", help_text="Введите текст поста")
-    pub_date = models.DateTimeField(
-        "Дата публикации", auto_now_add=True, db_index=True
-    )
+    pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -49,12 +52,32 @@ class Post(models.Model):
         verbose_name="Группа",
         help_text="Группа, к которой будет относиться пост",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка", upload_to="posts/", blank=True, storage=post_images
+    )
+    comments_count = models.PositiveIntegerField(
+        "Число комментариев", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
         ordering = ("-pub_date", "-id")
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"), name="posts_post_feed_idx"
+            ),
+            models.Index(
+                fields=("author", "-pub_date", "-id"),
+                name="posts_post_author_feed_idx",
+            ),
+            models.Index(
+                fields=("group", "-pub_date", "-id"),
+                name="posts_post_group_feed_idx",
+            ),
+            # Поиск других постов с тем же файлом перед его удалением.
+            models.Index(fields=("image",), name="posts_post_image_idx"),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -85,6 +108,12 @@ class Comment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ("-created", "-id")
+        indexes = (
+            models.Index(
+                fields=("post", "-created", "-id"),
+                name="posts_comment_post_idx",
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -110,6 +139,74 @@ class Follow(models.Model):
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         unique_together = ("user", "author")
+        indexes = (
+            models.Index(
+                fields=("author", "user"), name="posts_follow_author_idx"
+            ),
+        )
 
     def __str__(self):
         return f"{self.author} подписчики: {self.user}"
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, обновляемые при записи."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField("Число постов", default=0)
+    followers_count = models.PositiveIntegerField(
+        "Число подписчиков", default=0
+    )
+    following_count = models.PositiveIntegerField("Число подписок", default=0)
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+    def __str__(self):
+        return f"Статистика {self.user}"
+
+
+class Inbox(models.Model):
+    """Лента подписок пользователя, заполняемая при публикации поста."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="inbox",
+        verbose_name="Подписчик",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="inbox_entries",
+        verbose_name="Пост",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор поста",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты подписок"
+        verbose_name_plural = "Записи ленты подписок"
+        ordering = ("-pub_date", "-post_id")
+        unique_together = ("user", "post")
+        indexes = (
+            models.Index(
+                fields=("user", "-pub_date", "-post"),
+                name="posts_inbox_feed_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.post} в ленте {self.user}"
@@ -0,0 +1,114 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite текст постов индексируется таблицей FTS5 ``posts_post_fts``
+с внешним содержимым: сама таблица хранит только инвертированный индекс,
+а в синхронизации с ``posts_post`` ее держат триггеры, поэтому индекс
+обновляется при любой записи, в том числе при ``bulk_create``
+и ``update``. На других базах поиск откатывается к ``icontains``.
+"""
+import re
+
+from django.db import connections
+
+from .models import Post
+
+INDEX_TABLE = "posts_post_fts"
+
+MAX_TERMS = 8
+
+# Пересоздание таблицы (ALTER в SQLite) удаляет триггеры, поэтому схема
+# идемпотентна и повторяется после каждой миграции (см. PostsConfig).
+INDEX_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {INDEX_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {INDEX_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+)
+
+
+def install_index(connection):
+    """Создает индекс и триггеры, если их еще нет."""
+
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in INDEX_SCHEMA:
+            cursor.execute(sql)
+
+
+def rebuild_index(connection):
+    """Заново строит индекс по всем постам."""
+
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE}({INDEX_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def drop_index(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for action in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {INDEX_TABLE}_{action}")
+        cursor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+
+def search_terms(query):
+    """Слова запроса в нижнем регистре, не больше MAX_TERMS."""
+
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """Выражение MATCH: все слова, последнее - как префикс.
+
+    Каждое слово берется в кавычки, поэтому операторы FTS5 из запроса
+    пользователя не интерпретируются.
+    """
+
+    *words, last = terms
+    return " ".join([*(f'"{word}"' for word in words), f'"{last}"*'])
+
+
+def search_posts(query, queryset=None):
+    """Посты, в тексте которых есть все слова запроса.
+
+    Порядок выборки не меняется, поэтому результат можно листать
+    курсором, как обычную ленту.
+    """
+
+    if queryset is None:
+        queryset = Post.objects.all()
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    if connections[queryset.db].vendor != "sqlite":
+        for term in terms:
+            queryset = queryset.filter(text__icontains=term)
+        return queryset
+    # RawSQL в id__in оборачивается в двойные скобки, и SQLite берет
+    # из подзапроса только первую строку, поэтому условие задано через extra.
+    return queryset.extra(
+        where=[
+            f'"posts_post"."id" IN (SELECT rowid FROM {INDEX_TABLE} '
+            f"WHERE {INDEX_TABLE} MATCH %s)"
+        ],
+        params=[match_expression(terms)],
+    )
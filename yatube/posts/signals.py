@@ -0,0 +1,293 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.storage import post_images
+from core.utils import adjust_count, batches
+from .bulk import fill_follower_inbox
+from .feeds import (FEED_ALL, FEED_AUTHOR, FEED_FOLLOW, FEED_GROUP,
+                    FEED_POST, bump_feed_version, feed_count_key)
+from .models import Comment, Follow, Group, Inbox, Post, User, UserStats
+from .thumbnails import delete_image, schedule_thumbnails
+
+INBOX_BATCH_SIZE = 1000
+
+# Id постов и пользователей, которые удаляются в этом потоке прямо
+# сейчас: их комментарии уходят каскадом, и счетчики за них сдвигаются
+# разом, а не по комментарию.
+_deleting = threading.local()
+
+
+def _deleting_ids(kind):
+    ids = getattr(_deleting, kind, None)
+    if ids is None:
+        ids = set()
+        setattr(_deleting, kind, ids)
+    return ids
+
+
+def _follower_ids(author_id):
+    return (
+        Follow.objects.filter(author_id=author_id)
+        .values_list("user_id", flat=True)
+        .iterator()
+    )
+
+
+def _shift(queryset, field, delta):
+    """Атомарно сдвигает счетчик через F(), не опуская его ниже нуля."""
+
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _shift_stats(user_id, field, delta):
+    if _shift(UserStats.objects.filter(user_id=user_id), field, delta):
+        return
+    if delta > 0:
+        # Пользователь создан в обход сигналов, например bulk_create.
+        UserStats.objects.get_or_create(
+            user_id=user_id,
+            defaults={
+                "posts_count": Post.objects.filter(author_id=user_id).count(),
+                "followers_count": Follow.objects.filter(
+                    author_id=user_id
+                ).count(),
+                "following_count": Follow.objects.filter(
+                    user_id=user_id
+                ).count(),
+            },
+        )
+
+
+def _shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), "posts_count", delta)
+
+
+def _adjust_post_counts(post, delta):
+    adjust_count(feed_count_key(FEED_ALL), delta)
+    adjust_count(feed_count_key(FEED_AUTHOR, post.author_id), delta)
+    if post.group_id is not None:
+        adjust_count(feed_count_key(FEED_GROUP, post.group_id), delta)
+    _shift_stats(post.author_id, "posts_count", delta)
+    _shift_group(post.group_id, delta)
+
+
+def _bump_post_feeds(post, *group_ids):
+    bump_feed_version(FEED_ALL)
+    bump_feed_version(FEED_AUTHOR, post.author_id)
+    bump_feed_version(FEED_POST, post.pk)
+    for group_id in {post.group_id, *group_ids} - {None}:
+        bump_feed_version(FEED_GROUP, group_id)
+
+
+def _bump_follow_feeds(follow):
+    bump_feed_version(FEED_FOLLOW, follow.user_id)
+    bump_feed_version(FEED_AUTHOR, follow.user_id)
+    bump_feed_version(FEED_AUTHOR, follow.author_id)
+
+
+def _release_image(name):
+    """Удаляет файл картинки, когда на него не ссылается ни один пост.
+
+    Одинаковые картинки хранятся одним файлом (см. ContentAddressedStorage),
+    поэтому ссылки считаются по постам с тем же именем файла. Новый пост
+    с тем же файлом может быть еще не зафиксирован, но сохранение файла
+    обновило его mtime под той же блокировкой: такой файл остается,
+    а если пост так и не появится, его уберет collect_media_garbage.
+    """
+
+    def release():
+        with post_images.lock(name):
+            if post_images.recently_used(name, settings.IMAGE_REUSE_GRACE):
+                return
+            if not Post.objects.filter(image=name).exists():
+                delete_image(name)
+
+    if name:
+        transaction.on_commit(release)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и картинку редактируемого поста."""
+
+    if instance.pk is None or raw:
+        return
+    previous = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list("group_id", "image")
+        .first()
+    )
+    if previous is not None:
+        instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост в ленты подписчиков автора, обновляет
+    счетчики и версии лент.
+    """
+
+    if raw:
+        return
+    previous_image = getattr(instance, "_previous_image", None)
+    if instance.image and (created or instance.image.name != previous_image):
+        schedule_thumbnails(instance.image.name)
+    if not created and previous_image != instance.image.name:
+        _release_image(previous_image)
+    if not created:
+        previous = getattr(instance, "_previous_group_id", None)
+        _bump_post_feeds(instance, previous)
+        if previous != instance.group_id:
+            if previous is not None:
+                adjust_count(feed_count_key(FEED_GROUP, previous), -1)
+            if instance.group_id is not None:
+                adjust_count(feed_count_key(FEED_GROUP, instance.group_id), 1)
+            _shift_group(previous, -1)
+            _shift_group(instance.group_id, 1)
+        return
+    _bump_post_feeds(instance)
+    _adjust_post_counts(instance, 1)
+    for user_ids in batches(
+        _follower_ids(instance.author_id), INBOX_BATCH_SIZE
+    ):
+        Inbox.objects.bulk_create(
+            [
+                Inbox(
+                    user_id=user_id,
+                    post_id=instance.pk,
+                    author_id=instance.author_id,
+                    pub_date=instance.pub_date,
+                )
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+        for user_id in user_ids:
+            adjust_count(feed_count_key(FEED_FOLLOW, user_id), 1)
+
+
+@receiver(pre_delete, sender=Post)
+def mark_post_deleting(sender, instance, **kwargs):
+    _deleting_ids("posts").add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post(sender, instance, **kwargs):
+    """Уменьшает счетчики и версии лент, в которых был удаленный пост.
+
+    Счетчики лент подписок не уменьшаются по одному на подписчика,
+    а удаляются из кэша пачками: следующий просмотр посчитает их заново.
+    """
+
+    _deleting_ids("posts").discard(instance.pk)
+    _bump_post_feeds(instance)
+    _adjust_post_counts(instance, -1)
+    _release_image(instance.image.name)
+    for user_ids in batches(
+        _follower_ids(instance.author_id), INBOX_BATCH_SIZE
+    ):
+        cache.delete_many(
+            [feed_count_key(FEED_FOLLOW, user_id) for user_id in user_ids]
+        )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    """Комментарий меняет страницы лент, в которых показан пост."""
+
+    if raw:
+        return
+    if created:
+        _shift(Post.objects.filter(pk=instance.post_id), "comments_count", 1)
+    _bump_post_feeds(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if (
+        instance.post_id in _deleting_ids("posts")
+        or instance.author_id in _deleting_ids("users")
+    ):
+        # Счетчик уже сдвинут или пропадет вместе с постом.
+        return
+    _shift(Post.objects.filter(pk=instance.post_id), "comments_count", -1)
+    _bump_post_feeds(instance.post)
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_feed_version(FEED_GROUP, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_inbox(sender, instance, created, raw=False, **kwargs):
+    """Добавляет посты автора в ленту нового подписчика."""
+
+    if not created or raw:
+        return
+    added = fill_follower_inbox(instance.user_id, instance.author_id)
+    adjust_count(feed_count_key(FEED_FOLLOW, instance.user_id), added)
+    _shift_stats(instance.author_id, "followers_count", 1)
+    _shift_stats(instance.user_id, "following_count", 1)
+    _bump_follow_feeds(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_inbox(sender, instance, **kwargs):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+
+    removed, _ = Inbox.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).delete()
+    adjust_count(feed_count_key(FEED_FOLLOW, instance.user_id), -removed)
+    _shift_stats(instance.author_id, "followers_count", -1)
+    _shift_stats(instance.user_id, "following_count", -1)
+    _bump_follow_feeds(instance)
+
+
+@receiver(pre_delete, sender=User)
+def forget_user_comments(sender, instance, **kwargs):
+    """Комментарии удаляемого пользователя к чужим постам уходят
+    каскадом: счетчик каждого поста сдвигается один раз на их число.
+    """
+
+    _deleting_ids("users").add(instance.pk)
+    counts = (
+        Comment.objects.filter(author_id=instance.pk)
+        .exclude(post__author_id=instance.pk)
+        .values("post", "post__author", "post__group")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    for row in counts:
+        post = Post(
+            pk=row["post"],
+            author_id=row["post__author"],
+            group_id=row["post__group"],
+        )
+        _shift(
+            Post.objects.filter(pk=post.pk), "comments_count", -row["count"]
+        )
+        _bump_post_feeds(post)
+
+
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    _deleting_ids("users").discard(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
@@ -0,0 +1,29 @@
+from django import template
+
+from posts.thumbnails import lookup, lookup_many
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry):
+    """Готовая миниатюра картинки или None, пока ее готовит пул."""
+
+    if not image:
+        return None
+    return lookup(image.name, geometry)
+
+
+@register.simple_tag
+def resolve_thumbnails(posts, geometry):
+    """Находит миниатюры всех постов страницы разом и кладет каждую
+    в ``post.thumbnail`` для ``includes/post.html``.
+    """
+
+    posts = list(posts)
+    ready = lookup_many(
+        (post.image.name for post in posts if post.image), geometry
+    )
+    for post in posts:
+        post.thumbnail = ready.get(post.image.name) if post.image else None
+    return ""
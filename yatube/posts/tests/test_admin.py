@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.utils import EstimatedCountPaginator
+from ..models import Comment, Follow, Group, Post, User
+
+GAP = 3
+
+
+class AdminTest(TestCase):
+    """Списки админки не зависят от размера таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        cls.group = Group.objects.create(title="Группа", slug="group")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            author = User.objects.create_user(
+                username=f"author{User.objects.count()}"
+            )
+            post = Post.objects.create(
+                author=author, text="Пост", group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text="Да")
+            Follow.objects.create(user=self.admin, author=author)
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:posts_{model}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_constant_number_of_queries(self):
+        self.add_rows(1)
+        before = {
+            model: self.changelist_queries(model)
+            for model in ("post", "comment", "follow")
+        }
+        self.add_rows(GAP)
+        for model, queries in before.items():
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist_queries(model), queries)
+
+    def test_big_table_count_is_estimated(self):
+        self.add_rows(GAP)
+        url = reverse("admin:posts_post_changelist")
+        with mock.patch.object(
+            EstimatedCountPaginator, "exact_below", 1
+        ), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(
+            [q for q in queries if "COUNT(" in q["sql"].upper()],
+            "Список больших таблиц не должен выполнять COUNT(*)",
+        )
+        self.assertEqual(
+            response.context["cl"].result_count,
+            Post.objects.aggregate(last=Max("pk"))["last"],
+        )
+
+    def test_filtered_count_is_exact(self):
+        self.add_rows(GAP)
+        url = reverse("admin:posts_post_changelist")
+        with mock.patch.object(EstimatedCountPaginator, "exact_below", 1):
+            response = self.client.get(url, {"q": "Пост"})
+        self.assertEqual(response.context["cl"].result_count, GAP)
+
+    def test_change_forms_use_autocomplete(self):
+        self.add_rows(1)
+        pages = (
+            reverse("admin:posts_post_add"),
+            reverse("admin:posts_comment_add"),
+            reverse("admin:posts_follow_add"),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, "admin-autocomplete")
+                self.assertNotContains(response, "author0</option>")
+
+    def test_estimate_beyond_last_page_is_clamped(self):
+        """Завышенная оценка не дает пустых последних страниц."""
+
+        self.add_rows(GAP)
+        last = Post.objects.aggregate(last=Max("pk"))["last"]
+        Post.objects.order_by("pk")[0].delete()
+        with mock.patch.object(EstimatedCountPaginator, "exact_below", 1):
+            paginator = EstimatedCountPaginator(Post.objects.order_by("pk"), 1)
+            self.assertEqual(paginator.num_pages, last)
+            page = paginator.page(last)
+        self.assertEqual(page.number, GAP - 1)
+        self.assertEqual(page.object_list[0].pk, last)
+
+    def test_post_date_hierarchy_without_date_scan(self):
+        """Навигация по датам постов не перебирает даты всей таблицы
+        (DISTINCT), а берет из индекса первую и последнюю.
+        """
+
+        self.add_rows(3)
+        dates = (
+            datetime(2019, 11, 5, 12, tzinfo=timezone.utc),
+            datetime(2019, 12, 20, 12, tzinfo=timezone.utc),
+            datetime(2021, 2, 1, 12, tzinfo=timezone.utc),
+        )
+        for post, pub_date in zip(Post.objects.order_by("pk"), dates):
+            Post.objects.filter(pk=post.pk).update(pub_date=pub_date)
+        url = reverse("admin:posts_post_changelist")
+        pages = {
+            "": ["pub_date__year=2019", "pub_date__year=2021"],
+            "?pub_date__year=2019": [
+                "pub_date__month=11&amp;pub_date__year=2019",
+                "pub_date__month=12&amp;pub_date__year=2019",
+            ],
+            "?pub_date__year=2019&pub_date__month=11": [
+                "pub_date__day=5&amp;pub_date__month=11",
+            ],
+        }
+        for query, links in pages.items():
+            with self.subTest(query=query):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url + query)
+                self.assertContains(response, 'class="xfull"')
+                for link in links:
+                    self.assertContains(response, link)
+                self.assertFalse(
+                    [q for q in queries if "DISTINCT" in q["sql"].upper()]
+                )
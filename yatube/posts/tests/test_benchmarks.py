@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.urls import get_resolver
+
+from .. import benchmarks
+from ..models import Follow, Group, Post, User
+
+SIZES = {"users": 6, "groups": 2, "posts": 20, "comments": 10, "follows": 8}
+
+
+class BenchmarkTest(TestCase):
+    """Замеры покрывают все адреса posts и ловят регрессии."""
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.build_dataset(SIZES, seed=1)
+
+    def test_dataset_is_repeatable(self):
+        def dataset():
+            return (
+                list(
+                    Post.objects.order_by("pub_date").values_list(
+                        "text", "author__username", "group__slug"
+                    )
+                ),
+                Follow.objects.count(),
+            )
+
+        before = dataset()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        benchmarks.build_dataset(SIZES, seed=1)
+        self.assertEqual(dataset(), before)
+
+    def test_every_url_is_measured(self):
+        results = benchmarks.run(requests=2, warmup=0)
+        names = {
+            name
+            for name in get_resolver().namespace_dict["posts"][1]
+            .reverse_dict
+            if isinstance(name, str)
+        }
+        self.assertEqual(
+            names, {name.split(":")[0] for name in results}
+        )
+        for name, row in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(row["errors"], 0)
+                self.assertEqual(row["requests"], 2)
+                self.assertGreater(row["queries"], 0)
+                self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([7], 95), 7)
+
+    def test_compare_reports_regressions(self):
+        baseline = {"index": {"p95_ms": 10, "queries": 3}}
+        self.assertEqual(
+            benchmarks.compare(
+                {"index": {"p95_ms": 11, "queries": 3}}, baseline
+            ),
+            [],
+        )
+        regressions = benchmarks.compare(
+            {"index": {"p95_ms": 20, "queries": 4}}, baseline
+        )
+        self.assertEqual(len(regressions), 2)
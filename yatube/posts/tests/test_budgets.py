@@ -0,0 +1,103 @@
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.budgets import BUDGETS, Budget, within_budget
+from .. import benchmarks
+from ..models import User
+
+SIZES = {"users": 30, "groups": 3, "posts": 300, "comments": 300,
+         "follows": 100}
+
+
+class BudgetTest(TestCase):
+    """Каждый адрес posts и users укладывается в бюджет запросов и времени
+    на наборе данных команды seed - и с холодным, и с теплым кэшем.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.build_dataset(SIZES)
+
+    def check(self, plan):
+        """Проходит сценарии (клиент, адрес, сценарий) два раза: сначала
+        каждый после очистки кэша, затем с теплым кэшем.
+
+        Сценарии идут по порядку, чтобы отписка следовала за подпиской.
+        """
+
+        for run in ("холодный", "теплый"):
+            for client, name, scenario in plan:
+                if run == "холодный":
+                    cache.clear()
+                with self.subTest(scenario=scenario.name, cache=run):
+                    with within_budget(name):
+                        *_, status = benchmarks.measure(client, scenario)
+                    self.assertLess(status, 400)
+
+    def test_registry_covers_every_url(self):
+        names = set()
+        for namespace in ("posts", "users"):
+            resolver = get_resolver().namespace_dict[namespace][1]
+            names.update(
+                f"{namespace}:{name}"
+                for name in resolver.reverse_dict
+                if isinstance(name, str)
+            )
+        self.assertEqual(names, set(BUDGETS))
+
+    def test_posts_views(self):
+        user, scenarios = benchmarks.scenarios()
+        client = Client()
+        client.force_login(user)
+        self.check(
+            [
+                (client, "posts:" + scenario.name.split(":")[0], scenario)
+                for scenario in scenarios
+            ]
+        )
+
+    def test_users_views(self):
+        user = User.objects.first()
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        token = default_token_generator.make_token(user)
+        client = Client()
+        client.force_login(user)
+        pages = [
+            (Client(), "signup", ()),
+            (Client(), "login", ()),
+            (Client(), "password_reset_form", ()),
+            (Client(), "password_reset_done", ()),
+            (Client(), "password_reset_confirm", (uid, token)),
+            (Client(), "password_reset_complete", ()),
+            (client, "password_change_form", ()),
+            (client, "password_change_done", ()),
+        ]
+        self.check(
+            [
+                (
+                    page_client,
+                    f"users:{name}",
+                    benchmarks.Scenario(
+                        name, reverse(f"users:{name}", args=args)
+                    ),
+                )
+                for page_client, name, args in pages
+            ]
+        )
+
+    def test_logout(self):
+        client = Client()
+        client.force_login(User.objects.first())
+        with within_budget("users:logout"):
+            response = client.get(reverse("users:logout"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_exceeded_budget_lists_queries(self):
+        budgets = {"page": Budget(queries=0, ms=1000)}
+        with self.assertRaisesRegex(AssertionError, r"(?s)бюджете 0.*SELECT"):
+            with within_budget("page", budgets):
+                User.objects.count()
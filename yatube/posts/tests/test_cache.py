@@ -0,0 +1,104 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..feeds import FEED_ALL, FEED_FOLLOW, FEED_GROUP, feed_count_key
+from ..models import Follow, Group, Inbox, Post, User
+
+
+class FeedCountTest(TestCase):
+    """Тестирование кэша счетчиков лент."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.author = User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text="Тестовый пост", group=cls.group
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+        cache.clear()
+
+    def paginator_count(self, url, client=None):
+        response = (client or self.client).get(url)
+        return response.context["page_obj"].paginator.count
+
+    def test_count_is_cached(self):
+        """Повторный запрос ленты не выполняет COUNT(*)."""
+
+        url = reverse("posts:index")
+        self.assertEqual(self.paginator_count(url), 1)
+        self.assertEqual(cache.get(feed_count_key(FEED_ALL)), 1)
+        response = self.authorized_client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(response.context["page_obj"].paginator.count, 1)
+
+    def test_count_follows_post_writes(self):
+        """Создание, перенос и удаление поста меняют счетчики лент."""
+
+        url = reverse("posts:group_list", args=(self.group.slug,))
+        self.assertEqual(self.paginator_count(url), 1)
+        post = Post.objects.create(
+            author=self.author, text="Второй пост", group=self.group
+        )
+        self.assertEqual(
+            cache.get(feed_count_key(FEED_GROUP, self.group.pk)), 2
+        )
+        post.group = None
+        post.save()
+        self.assertEqual(self.paginator_count(url), 1)
+        self.post.delete()
+        self.assertEqual(self.paginator_count(url), 0)
+
+    def test_count_follows_subscriptions(self):
+        """Подписка и отписка меняют счетчик ленты подписок."""
+
+        url = reverse("posts:follow_index")
+        self.assertEqual(self.paginator_count(url, self.authorized_client), 0)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text="Второй пост")
+        self.assertEqual(
+            cache.get(feed_count_key(FEED_FOLLOW, self.user.pk)), 2
+        )
+        follow.delete()
+        self.assertEqual(self.paginator_count(url, self.authorized_client), 0)
+
+    def test_backfill_counts_only_new_entries(self):
+        """Записи ленты, которые уже были, не увеличивают счетчик."""
+
+        Inbox.objects.create(
+            user=self.user,
+            post=self.post,
+            author=self.author,
+            pub_date=self.post.pub_date,
+        )
+        Post.objects.create(author=self.author, text="Второй пост")
+        url = reverse("posts:follow_index")
+        self.assertEqual(self.paginator_count(url, self.authorized_client), 1)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            cache.get(feed_count_key(FEED_FOLLOW, self.user.pk)), 2
+        )
+        self.assertEqual(Inbox.objects.filter(user=self.user).count(), 2)
+
+    def test_reconcile_repairs_drift(self):
+        """Команда reconcile_feed_counts исправляет разошедшиеся счетчики."""
+
+        cache.set(feed_count_key(FEED_ALL), 100)
+        cache.set(feed_count_key(FEED_GROUP, self.group.pk), 1)
+        out = StringIO()
+        call_command("reconcile_feed_counts", stdout=out)
+        self.assertIn("Исправлено счетчиков: 1", out.getvalue())
+        self.assertEqual(cache.get(feed_count_key(FEED_ALL)), 1)
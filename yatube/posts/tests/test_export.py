@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+POSTS = 5
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTest(TestCase):
+    """Выгрузка постов и комментариев автора идет потоком пачками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="Pushkin")
+        cls.reader = User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f"Пост, \"{number}\"", group=cls.group
+            )
+            for number in range(POSTS)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text="Свой комментарий"
+        )
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text="Чужой"
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def export_url(self, kind="posts", username=None):
+        return reverse(
+            "posts:export", args=(username or self.author.username, kind)
+        )
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_posts_ndjson_streamed_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.export_url())
+            self.assertTrue(response.streaming)
+            self.assertEqual(
+                response["Content-Type"], "application/x-ndjson; charset=utf-8"
+            )
+            records = [json.loads(line) for line in self.read(response)
+                       .splitlines()]
+        self.assertEqual(
+            [record["id"] for record in records],
+            [post.pk for post in self.posts],
+        )
+        self.assertEqual(records[0]["text"], 'Пост, "0"')
+        self.assertEqual(records[0]["group_slug"], "group")
+        chunks = [
+            query for query in queries.captured_queries
+            if '"posts_post"."text"' in query["sql"]
+        ]
+        # По две строки на запрос и последний неполный.
+        self.assertEqual(len(chunks), 3)
+        self.assertIn('"posts_post"."id" >', chunks[-1]["sql"])
+
+    def test_comments_csv(self):
+        response = self.client.get(
+            self.export_url("comments"), {"format": "csv"}
+        )
+        self.assertEqual(
+            response["Content-Type"], "text/csv; charset=utf-8"
+        )
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["text"], "Свой комментарий")
+        self.assertEqual(rows[0]["post_id"], str(self.posts[0].pk))
+
+    def test_export_is_private(self):
+        response = self.client.get(self.export_url(username="Lermontov"))
+        self.assertEqual(response.status_code, 403)
+        self.reader.is_staff = True
+        self.reader.save()
+        self.client.force_login(self.reader)
+        response = self.client.get(self.export_url())
+        self.assertEqual(response.status_code, 200)
+        response = Client().get(self.export_url())
+        self.assertEqual(response.status_code, 302)
+
+    def test_unknown_kind_or_format(self):
+        self.assertEqual(
+            self.client.get(self.export_url("follows")).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(self.export_url(), {"format": "xml"}).status_code,
+            404,
+        )
+
+    def test_command_matches_endpoint(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "posts.csv")
+        call_command("export_author", "Pushkin", format="csv", output=path)
+        with open(path, newline="", encoding="utf-8") as exported:
+            content = exported.read()
+        response = self.client.get(self.export_url(), {"format": "csv"})
+        self.assertEqual(content, self.read(response))
+        out = StringIO()
+        call_command("export_author", "Pushkin", kind="comments", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
@@ -1,19 +1,35 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from concurrent.futures import Future
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
 
+from core import uploads
+from core.uploads import BoundedUploadHandler
 from ..models import Comment, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+def stored_name(content, extension):
+    """Имя, под которым ContentAddressedStorage сохранит файл."""
+
+    digest = hashlib.sha256(content).hexdigest()
+    return f"posts/{digest[:2]}/{digest}{extension}"
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class FormTest(TestCase):
     """Тестирование форм."""
 
@@ -50,6 +66,8 @@ class FormTest(TestCase):
         cls.uploaded2 = SimpleUploadedFile(
             name="big.gif", content=big_gif, content_type="image/gif"
         )
+        cls.small_name = stored_name(small_gif, ".gif")
+        cls.big_name = stored_name(big_gif, ".gif")
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.user)
 
@@ -84,7 +102,9 @@ class FormTest(TestCase):
         )
         self.assertTrue(
             Post.objects.filter(
-                text="Новый пост", group=self.group.pk, image="posts/small.gif"
+                text="Новый пост",
+                group=self.group.pk,
+                image=self.small_name,
             ).exists(),
             "Запись не добавлена",
         )
@@ -112,7 +132,7 @@ class FormTest(TestCase):
             Post.objects.filter(
                 text="Редактированный пост",
                 group=group2.id,
-                image="posts/big.gif",
+                image=self.big_name,
             ).exists(),
             "Запись не редактируется",
         )
@@ -212,3 +232,132 @@ class FormTest(TestCase):
             comment_count + 1,
             "Авторизованный пользователь не может добавить комментарий",
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageUploadTest(TestCase):
+    """Тестирование ограничений загружаемых картинок."""
+
+    small_gif = (
+        b"\x47\x49\x46\x38\x39\x61\x02\x00"
+        b"\x01\x00\x80\x00\x00\x00\x00\x00"
+        b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+        b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+        b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+        b"\x0A\x00\x3B"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create(self, content, name="upload.gif"):
+        image = SimpleUploadedFile(
+            name=name, content=content, content_type="image/gif"
+        )
+        return self.authorized_client.post(
+            reverse("posts:post_create"),
+            data={"text": "Пост с картинкой", "image": image},
+        )
+
+    def test_upload_is_streamed_to_disk_up_to_limit(self):
+        request = RequestFactory().get("/")
+        handler = BoundedUploadHandler(request)
+        handler.new_file("image", "big.gif", "image/gif", None)
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=10):
+            handler.receive_data_chunk(b"x" * 8, 0)
+            handler.receive_data_chunk(b"x" * 8, 8)
+            handler.receive_data_chunk(b"x" * 8, 16)
+        upload = handler.file_complete(24)
+        self.assertTrue(hasattr(upload, "temporary_file_path"))
+        self.assertEqual(upload.size, 24)
+        self.assertEqual(len(upload.read()), 11)
+        upload.close()
+
+    def test_oversized_upload_is_rejected_before_decode(self):
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=10), mock.patch(
+            "core.uploads.Image.open"
+        ) as image_open:
+            response = self.create(self.small_gif)
+        self.assertFalse(image_open.called)
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Размер файла не должен превышать 10\xa0байт.",
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_many_pixels_rejected_by_header(self):
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=1), mock.patch(
+            "core.uploads._run_decode"
+        ) as decode:
+            response = self.create(self.small_gif)
+        self.assertFalse(decode.called)
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Слишком большое разрешение картинки: 2x1.",
+        )
+
+    def test_broken_image_rejected_by_decode(self):
+        """Обрезанный JPEG проходит проверку заголовка, но не декодируется."""
+
+        jpeg = BytesIO()
+        Image.new("RGB", (64, 64), "red").save(jpeg, "JPEG")
+        with override_settings(IMAGE_DECODE_WORKERS=0):
+            response = self.create(jpeg.getvalue()[:-20], "broken.jpg")
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Файл поврежден или не является картинкой.",
+        )
+
+    def test_image_decoded_in_process_pool(self):
+        response = self.create(self.small_gif)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertTrue(
+            Post.objects.filter(
+                image=stored_name(self.small_gif, ".gif")
+            ).exists()
+        )
+
+    def test_decode_timeout_recycles_pool(self):
+        """Декодирование, не уложившееся в срок, не занимает процесс пула:
+        пул заменяется новым.
+        """
+
+        pool = uploads._get_pool()
+        # Декодирование, которое не закончится никогда.
+        with override_settings(IMAGE_DECODE_TIMEOUT=0.01), mock.patch.object(
+            pool, "submit", return_value=Future()
+        ):
+            response = self.create(self.small_gif)
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Не удалось обработать картинку вовремя.",
+        )
+        self.assertIsNot(uploads._get_pool(), pool)
+        response = self.create(self.small_gif)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_identical_uploads_share_one_file(self):
+        self.create(self.small_gif, "first.gif")
+        self.create(self.small_gif, "second.GIF")
+        name = stored_name(self.small_gif, ".gif")
+        self.assertEqual(Post.objects.filter(image=name).count(), 2)
+        directory = os.path.join(TEMP_MEDIA_ROOT, os.path.dirname(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
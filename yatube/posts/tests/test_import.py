@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.management.commands.bulk_import import Checkpoint, Command
+from ..feeds import FEED_ALL, FEED_FOLLOW, feed_count_key
+from ..models import Comment, Follow, Group, Inbox, Post, User
+from ..search import search_posts
+
+USERS = [
+    {"id": 101, "username": "pushkin", "email": "a@example.com"},
+    {"id": 102, "username": "lermontov"},
+    {"id": 103, "username": "tolstoy"},
+]
+GROUPS = "id,slug,title,description\n7,poetry,Поэзия,Стихи\n"
+POSTS = [
+    {
+        "id": 500 + number,
+        "author": 101,
+        "group": 7 if number % 2 else "",
+        "text": f"Импортированный пост {number}",
+        "pub_date": f"2001-01-{number + 1:02d}T10:00:00",
+    }
+    for number in range(5)
+]
+COMMENTS = [
+    {"post": 501, "author": 102, "text": "Первый", "created": "2002-02-02"},
+    {"post": 501, "author": 103, "text": "Второй"},
+    {"post": 999, "author": 103, "text": "Поста нет"},
+]
+FOLLOWS = "user,author\n102,101\n103,101\n101,101\n"
+
+
+class BulkImportTest(TestCase):
+    """Команда bulk_import переносит данные пачками и восстанавливает
+    то, что при обычной записи делают сигналы.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.files = {
+            "users": self.write("users.ndjson", USERS),
+            "groups": self.write("groups.csv", GROUPS),
+            "posts": self.write("posts.ndjson", POSTS),
+            "comments": self.write("comments.ndjson", COMMENTS),
+            "follows": self.write("follows.csv", FOLLOWS),
+        }
+        self.checkpoint = os.path.join(self.directory, "checkpoint.ndjson")
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        if not isinstance(content, str):
+            content = "".join(
+                json.dumps(record, ensure_ascii=False) + "\n"
+                for record in content
+            )
+        with open(path, "w", encoding="utf-8") as target:
+            target.write(content)
+        return path
+
+    def run_import(self, **options):
+        out = StringIO()
+        call_command(
+            "bulk_import",
+            **self.files,
+            batch_size=2,
+            checkpoint=self.checkpoint,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def test_import_keeps_data_and_links(self):
+        out = self.run_import()
+        self.assertIn(
+            "Импортировано: пользователей 3, групп 1, постов 5, "
+            "комментариев 2, подписок 2 (пропущено 2)",
+            out,
+        )
+        pushkin = User.objects.get(username="pushkin")
+        self.assertEqual(pushkin.email, "a@example.com")
+        self.assertFalse(pushkin.has_usable_password())
+        post = Post.objects.get(text="Импортированный пост 1")
+        self.assertEqual(post.author, pushkin)
+        self.assertEqual(post.group.slug, "poetry")
+        self.assertEqual(
+            post.pub_date, datetime(2001, 1, 2, 10, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            post.comments.get(text="Первый").created,
+            datetime(2002, 2, 2, tzinfo=timezone.utc),
+        )
+        self.assertFalse(
+            Follow.objects.filter(user=pushkin, author=pushkin).exists()
+        )
+
+    def test_counters_inbox_and_caches_rebuilt(self):
+        cache.set(feed_count_key(FEED_ALL), 0)
+        self.run_import()
+        pushkin = User.objects.get(username="pushkin")
+        self.assertEqual(pushkin.stats.posts_count, 5)
+        self.assertEqual(pushkin.stats.followers_count, 2)
+        self.assertEqual(Group.objects.get().posts_count, 2)
+        self.assertEqual(
+            Post.objects.get(text="Импортированный пост 1").comments_count, 2
+        )
+        follower = User.objects.get(username="lermontov")
+        self.assertEqual(Inbox.objects.filter(user=follower).count(), 5)
+        self.assertEqual(cache.get(feed_count_key(FEED_ALL)), 5)
+        self.assertIsNone(cache.get(feed_count_key(FEED_FOLLOW, follower.pk)))
+        self.assertEqual(
+            search_posts("импортированный").count(), len(POSTS)
+        )
+
+    def test_rows_are_inserted_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import()
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "posts_post"')
+        ]
+        self.assertEqual(len(inserts), 3)
+
+    def test_resume_from_checkpoint(self):
+        """После сбоя импорт продолжается без дублей и со ссылками на
+        записи, созданные до сбоя.
+        """
+
+        with mock.patch.object(
+            Command, "build_comments", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 0)
+        self.run_import()
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 5)
+        post = Post.objects.get(text="Импортированный пост 1")
+        self.assertEqual(post.comments.count(), 2)
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_crash_between_checkpoint_and_commit(self):
+        """Пачка, записанная в журнал, но не зафиксированная в базе,
+        при продолжении импортируется заново, без дублей и потерь.
+        """
+
+        record = Checkpoint.record
+
+        def crash_after(crash_kind, crash_position):
+            def record_then_crash(checkpoint, kind, *args):
+                record(checkpoint, kind, *args)
+                if (kind, checkpoint.positions[kind]) == (
+                    crash_kind,
+                    crash_position,
+                ):
+                    raise RuntimeError
+
+            return mock.patch.object(Checkpoint, "record", record_then_crash)
+
+        with crash_after("posts", 4), self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertEqual(Post.objects.count(), 2)
+        with crash_after("follows", 2), self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertEqual(Follow.objects.count(), 0)
+        self.run_import()
+        self.assertEqual(
+            sorted(Post.objects.values_list("text", flat=True)),
+            sorted(post["text"] for post in POSTS),
+        )
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_torn_checkpoint_line_is_dropped(self):
+        """Недописанная строка журнала не мешает продолжению."""
+
+        with mock.patch.object(
+            Command, "build_comments", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.run_import()
+        with open(self.checkpoint, "a", encoding="utf-8") as log:
+            log.write('{"kind": "comments", "posi')
+        self.run_import()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_existing_users_are_reused(self):
+        existing = User.objects.create_user(username="pushkin")
+        self.run_import()
+        self.assertEqual(User.objects.filter(username="pushkin").count(), 1)
+        self.assertEqual(existing.posts.count(), 5)
+        # Новые объекты получают id после вставленных явно.
+        self.assertGreater(
+            User.objects.create_user(username="gogol").pk,
+            User.objects.get(username="tolstoy").pk,
+        )
@@ -1,6 +1,26 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-from ..models import Comment, Group, Post
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.storage import post_images
+from .. import thumbnails
+from ..management.commands import collect_media_garbage
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class ModelTest(TestCase):
@@ -26,3 +46,275 @@ class ModelTest(TestCase):
                     expected,
                     f"У модели {value} некорректно работает __str__",
                 )
+
+
+class CounterTest(TestCase):
+    """Тестирование денормализованных счетчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.author = User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(title="Тестовая группа", slug="g")
+
+    def assertCounters(self, posts, comments, followers):
+        self.author.stats.refresh_from_db()
+        self.user.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, posts)
+        self.assertEqual(self.group.posts_count, posts)
+        self.assertEqual(
+            sum(Post.objects.values_list("comments_count", flat=True)),
+            comments,
+        )
+        self.assertEqual(self.author.stats.followers_count, followers)
+        self.assertEqual(self.user.stats.following_count, followers)
+
+    def test_counters_follow_writes(self):
+        """Счетчики меняются при создании и удалении объектов."""
+
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.user, text="Комментарий"
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertCounters(posts=1, comments=1, followers=1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertCounters(posts=0, comments=0, followers=0)
+
+    def delete_queries(self, obj):
+        with CaptureQueriesContext(connection) as queries:
+            obj.delete()
+        return len(queries)
+
+    def popular_post(self, readers):
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        for number in range(readers):
+            reader = User.objects.create_user(
+                username=f"reader{readers}-{number}"
+            )
+            Follow.objects.create(user=reader, author=self.author)
+            Comment.objects.create(post=post, author=reader, text="Да")
+        return post
+
+    def test_post_delete_does_not_scale_with_readers(self):
+        """Удаление поста не тратит запросов на каждого подписчика
+        и комментарий.
+        """
+
+        few = self.delete_queries(self.popular_post(1))
+        Follow.objects.all().delete()
+        many = self.delete_queries(self.popular_post(5))
+        self.assertEqual(many, few)
+        Follow.objects.all().delete()
+        self.assertCounters(posts=0, comments=0, followers=0)
+
+    def test_user_delete_shifts_comment_counts_once(self):
+        """Комментарии удаленного пользователя уходят из счетчика поста."""
+
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        for _ in range(3):
+            Comment.objects.create(post=post, author=self.user, text="Да")
+        Comment.objects.create(post=post, author=self.author, text="Нет")
+        self.user.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters пересчитывает счетчики."""
+
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text="Текст")
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.all().delete()
+        Post.objects.update(comments_count=10)
+        Group.objects.update(posts_count=10)
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertCounters(posts=1, comments=1, followers=1)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0, IMAGE_REUSE_GRACE=0
+)
+class SharedImageTest(TransactionTestCase):
+    """Одинаковые картинки хранятся одним файлом до последней ссылки."""
+
+    gif = (
+        b"\x47\x49\x46\x38\x39\x61\x02\x00"
+        b"\x01\x00\x80\x00\x00\x00\x00\x00"
+        b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+        b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+        b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+        b"\x0A\x00\x3B"
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="Pushkin")
+
+    def create(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text="Мем",
+            image=SimpleUploadedFile(name, self.gif, "image/gif"),
+        )
+
+    def exists(self, post):
+        return os.path.exists(os.path.join(TEMP_MEDIA_ROOT, post.image.name))
+
+    def test_file_deleted_with_last_post(self):
+        first, second = self.create("meme.gif"), self.create("copy.gif")
+        self.assertEqual(first.image.name, second.image.name)
+
+        first.delete()
+        self.assertTrue(self.exists(second))
+        second.delete()
+        self.assertFalse(self.exists(second))
+
+    def test_file_released_when_image_replaced(self):
+        post = self.create("meme.gif")
+        old = post.image.name
+        post.image = SimpleUploadedFile("other.gif", self.gif[:-1] + b"\x3C")
+        post.save()
+        self.assertNotEqual(post.image.name, old)
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, old))
+        )
+        self.assertTrue(self.exists(post))
+
+    @override_settings(IMAGE_REUSE_GRACE=60)
+    def test_reused_file_survives_release(self):
+        """Последний пост удаляется, пока другой запрос сохраняет те же
+        байты для поста, который еще не зафиксирован."""
+
+        post = self.create("meme.gif")
+        path = os.path.join(TEMP_MEDIA_ROOT, post.image.name)
+        # Файл загружен давно: без повторного использования его удалят.
+        past = time.time() - 3600
+        os.utime(path, (past, past))
+        with transaction.atomic():
+            post.delete()
+            reused = post_images.save("posts/copy.gif", ContentFile(self.gif))
+        self.assertEqual(reused, post.image.name)
+        self.assertTrue(os.path.exists(path))
+
+        copy = Post.objects.create(author=self.user, text="Мем", image=reused)
+        os.utime(path, (past, past))
+        copy.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class MediaGarbageTest(TestCase):
+    """Тестирование сборки осиротевших картинок и миниатюр."""
+
+    gif = SharedImageTest.gif
+
+    def setUp(self):
+        # Команда обходит весь MEDIA_ROOT: у каждого теста он свой.
+        self.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.post = Post.objects.create(
+            author=User.objects.create_user(username="Pushkin"),
+            text="Пост",
+            image=SimpleUploadedFile("kept.gif", self.gif, "image/gif"),
+        )
+        self.orphan = post_images.save(
+            "posts/orphan.gif", ContentFile(self.gif[:-1] + b"\x3C")
+        )
+        for name in (self.post.image.name, self.orphan):
+            thumbnails.generate_thumbnails(name)
+        self.stray = default_storage.save(
+            "cache/00/00/stray.jpg", ContentFile(b"x")
+        )
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def thumbnail_files(self, name):
+        ready = thumbnails.lookup(name, "960x339")
+        return [
+            url.split()[0][len(settings.MEDIA_URL):]
+            for url in ready["srcset"].split(", ")
+        ]
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command(
+            "collect_media_garbage", "--min-age=0", "-v2", *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_dry_run_only_reports(self):
+        orphan_thumbnails = self.thumbnail_files(self.orphan)
+        output = self.collect("--dry-run")
+        self.assertIn(f"Картинка: {self.orphan}", output)
+        self.assertIn(f"Файл миниатюры: {self.stray}", output)
+        self.assertIn(
+            "Будет удалено: картинок 1, записей миниатюр 0, "
+            "файлов миниатюр 1",
+            output,
+        )
+        for name in (self.orphan, self.stray, *orphan_thumbnails):
+            self.assertTrue(self.exists(name))
+
+    def test_orphans_deleted_and_referenced_kept(self):
+        kept_thumbnails = self.thumbnail_files(self.post.image.name)
+        orphan_thumbnails = self.thumbnail_files(self.orphan)
+        output = self.collect()
+        self.assertIn(
+            "Удалено: картинок 1, записей миниатюр 0, файлов миниатюр 1",
+            output,
+        )
+        for name in (self.orphan, self.stray, *orphan_thumbnails):
+            self.assertFalse(self.exists(name))
+        for name in (self.post.image.name, *kept_thumbnails):
+            self.assertTrue(self.exists(name))
+
+    def test_reused_between_check_and_delete(self):
+        """Картинку повторно используют после сверки пачки с базой."""
+
+        past = time.time() - 3600
+        os.utime(os.path.join(self.media_root, self.orphan), (past, past))
+        command = collect_media_garbage.Command
+        referenced = command.referenced
+
+        def reuse_after_check(command_self, names):
+            result = referenced(command_self, names)
+            post_images.save(
+                "posts/again.gif", ContentFile(self.gif[:-1] + b"\x3C")
+            )
+            return result
+
+        out = StringIO()
+        with mock.patch.object(command, "referenced", reuse_after_check):
+            call_command("collect_media_garbage", "--min-age=60", stdout=out)
+        self.assertIn("Удалено: картинок 0", out.getvalue())
+        self.assertTrue(self.exists(self.orphan))
+
+    def test_dead_store_entries_deleted(self):
+        """Записи миниатюр файла, удаленного мимо delete_image."""
+
+        os.remove(os.path.join(self.media_root, self.orphan))
+        output = self.collect()
+        self.assertIn("записей миниатюр 1", output)
+        self.assertIn("файлов миниатюр 1", output)
+        self.assertIn("Удалено: картинок 0", output)
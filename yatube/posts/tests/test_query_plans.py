@@ -0,0 +1,88 @@
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?posts_\w+$")
+TEMP_SORT = "USE TEMP B-TREE"
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент идут по индексам: без полного сканирования таблиц
+    постов и без временной сортировки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.author = User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(title="Тестовая группа", slug="g")
+        cls.post = Post.objects.create(
+            author=cls.author, text="Тестовый пост", group=cls.group
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text="Текст")
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+        cache.clear()
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_views_use_indexes(self):
+        """Ленты и страница поста не сканируют таблицы и не сортируют."""
+
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN есть только в SQLite")
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.author.username,)),
+            reverse("posts:follow_index"),
+            reverse("posts:post_detail", args=(self.post.pk,)),
+        )
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            for query in queries.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or "posts_" not in sql:
+                    continue
+                # Параметры уже подставлены в sql, EXPLAIN их не требует.
+                plan = self.explain(sql, ())
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        self.assertNotRegex(step, FULL_SCAN, plan)
+                        self.assertNotIn(TEMP_SORT, step, plan)
+
+    def test_search_uses_full_text_index(self):
+        """Поиск выбирает посты по индексу FTS5, а не перебором текстов.
+
+        Найденные посты сортируются: их немного по сравнению с лентой.
+        """
+
+        if connection.vendor != "sqlite":
+            self.skipTest("Индекс FTS5 есть только в SQLite")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("posts:search"), {"q": "Тестовый"})
+        plans = [
+            self.explain(query["sql"], ())
+            for query in queries.captured_queries
+            if "MATCH" in query["sql"]
+        ]
+        self.assertEqual(len(plans), 1)
+        for step in plans[0]:
+            self.assertNotRegex(step, FULL_SCAN, plans[0])
+        self.assertTrue(
+            any("VIRTUAL TABLE INDEX" in step for step in plans[0]), plans[0]
+        )
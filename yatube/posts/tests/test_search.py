@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from yatube.settings import POSTS_PER_PAGE
+
+from ..models import Post, User
+from ..search import search_posts
+
+
+class SearchTest(TestCase):
+    """Тестирование полнотекстового поиска."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=text)
+            for text in (
+                "Мороз и солнце; день чудесный!",
+                "Еще ты дремлешь, друг прелестный",
+                "Вечор, ты помнишь, вьюга злилась",
+                "Под голубыми небесами великолепными коврами",
+            )
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return list(search_posts(query))
+
+    def test_finds_words_in_any_case(self):
+        self.assertEqual(self.found("МОРОЗ"), [self.posts[0]])
+        self.assertEqual(self.found("ты"), [self.posts[2], self.posts[1]])
+        self.assertEqual(self.found("ты вьюга"), [self.posts[2]])
+
+    def test_last_word_matches_prefix(self):
+        self.assertEqual(self.found("голуб"), [self.posts[3]])
+        self.assertEqual(self.found("голубыми небес"), [self.posts[3]])
+        self.assertEqual(self.found("голуб небесами"), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.found('мороз OR "друг'), [])
+        self.assertEqual(self.found("*** ()"), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.posts[0]
+        post.text = "Буря мглою небо кроет"
+        post.save()
+        self.assertEqual(self.found("мороз"), [])
+        self.assertEqual(self.found("буря"), [post])
+        post.delete()
+        self.assertEqual(self.found("буря"), [])
+
+    def test_index_follows_bulk_writes(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text="Зимнее утро")]
+        )
+        self.assertEqual(len(self.found("утро")), 1)
+        Post.objects.filter(text="Зимнее утро").update(text="Зимний вечер")
+        self.assertEqual(self.found("утро"), [])
+        self.assertEqual(len(self.found("вечер")), 1)
+
+    def test_search_page_pages_with_cursor(self):
+        for number in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(author=self.user, text=f"Сказка {number}")
+        url = reverse("posts:search")
+        response = self.client.get(url, {"q": "сказка"})
+        page_obj = response.context["page_obj"]
+        self.assertTrue(page_obj.is_cursor)
+        self.assertEqual(len(page_obj), POSTS_PER_PAGE)
+        self.assertContains(
+            response, "?q=%D1%81%D0%BA%D0%B0%D0%B7%D0%BA%D0%B0&cursor="
+        )
+        response = self.client.get(
+            url, {"q": "сказка", "cursor": page_obj.next_cursor}
+        )
+        self.assertEqual(
+            [post.text for post in response.context["page_obj"]],
+            ["Сказка 0"],
+        )
+
+    def test_empty_query_finds_nothing(self):
+        response = self.client.get(reverse("posts:search"))
+        self.assertEqual(len(response.context["page_obj"]), 0)
+
+    def test_admin_search_uses_index(self):
+        admin = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse("admin:posts_post_changelist"), {"q": "вьюга"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.posts[2]]
+        )
+        if connection.vendor == "sqlite":
+            sql = str(response.context["cl"].queryset.query)
+            self.assertIn("MATCH", sql)
+            self.assertNotIn("LIKE", sql)
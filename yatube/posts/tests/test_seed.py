@@ -0,0 +1,93 @@
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from posts.management.commands.seed import power_law_rank
+from ..models import Comment, Follow, Group, Inbox, Post, User, UserStats
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedTest(TestCase):
+    """Команда seed заполняет базу перекошенными данными по зерну."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        sizes = {
+            "users": 50,
+            "groups": 3,
+            "posts": 400,
+            "comments": 200,
+            "follows": 300,
+            "batch_size": 100,
+        }
+        call_command("seed", **{**sizes, **options}, stdout=StringIO())
+
+    def test_power_law_rank(self):
+        rng = random.Random(0)
+        ranks = [power_law_rank(rng, 100, 1.1) for _ in range(10000)]
+        self.assertEqual(min(ranks), 0)
+        self.assertLessEqual(max(ranks), 99)
+        self.assertGreater(ranks.count(0), 10 * ranks.count(50))
+
+    def test_rows_and_counters(self):
+        self.seed()
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F("author_id")).exists()
+        )
+        counts = sorted(
+            UserStats.objects.values_list("posts_count", flat=True),
+            reverse=True,
+        )
+        self.assertEqual(sum(counts), 400)
+        # Степенной закон: самый плодовитый автор пишет куда больше
+        # медианного.
+        self.assertGreater(counts[0], 5 * max(counts[len(counts) // 2], 1))
+        follow = Follow.objects.first()
+        self.assertEqual(
+            Inbox.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count(),
+        )
+
+    def test_same_seed_same_data(self):
+        def dataset():
+            return list(
+                Post.objects.order_by("pub_date").values_list(
+                    "text", "author__username", "group__slug", "pub_date"
+                )
+            )
+
+        self.seed(seed=7)
+        first = dataset()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(dataset(), first)
+
+    def test_images_are_shared(self):
+        self.seed(images=0.5)
+        names = set(
+            Post.objects.exclude(image="").values_list("image", flat=True)
+        )
+        self.assertTrue(names)
+        self.assertLessEqual(len(names), 16)
+
+    def test_too_small(self):
+        with self.assertRaises(CommandError):
+            self.seed(users=1)
@@ -0,0 +1,190 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.locks import file_lock
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+RENDERS = 8
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailHerdTest(TransactionTestCase):
+    """Одновременные промахи кэша миниатюр рендерят картинку один раз."""
+
+    def setUp(self):
+        cache.clear()
+        small_gif = (
+            b"\x47\x49\x46\x38\x39\x61\x02\x00"
+            b"\x01\x00\x80\x00\x00\x00\x00\x00"
+            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+            b"\x0A\x00\x3B"
+        )
+        # Картинка попадает на страницу раньше, чем ее подготовит пул.
+        with mock.patch("posts.signals.schedule_thumbnails"):
+            self.post = Post.objects.create(
+                author=User.objects.create_user(username="Pushkin"),
+                text="Популярный пост",
+                image=SimpleUploadedFile(
+                    name="herd.gif",
+                    content=small_gif,
+                    content_type="image/gif",
+                ),
+            )
+        self.template = Template(
+            "{% load post_images %}"
+            '{% resolve_thumbnails posts "960x339" %}'
+            "{% for post in posts %}"
+            "{% include 'includes/post.html' %}"
+            "{% endfor %}"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def render(self, barrier, pages):
+        try:
+            post = Post.objects.select_related("author").get(pk=self.post.pk)
+            barrier.wait()
+            pages.append(self.template.render(Context({"posts": [post]})))
+        finally:
+            connection.close()
+
+    def test_concurrent_renders_encode_once(self):
+        real_get_thumbnail = thumbnails.get_thumbnail
+
+        def slow_get_thumbnail(*args, **kwargs):
+            # Растягиваем рендер, чтобы остальные потоки успели промахнуться.
+            time.sleep(0.2)
+            return real_get_thumbnail(*args, **kwargs)
+
+        barrier = threading.Barrier(RENDERS)
+        pages = []
+        with mock.patch.object(
+            thumbnails, "get_thumbnail", side_effect=slow_get_thumbnail
+        ) as encode:
+            workers = [
+                threading.Thread(target=self.render, args=(barrier, pages))
+                for _ in range(RENDERS)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        # Каждый вариант рендерится ровно один раз.
+        self.assertEqual(
+            encode.call_count,
+            len(thumbnails.variant_widths("960x339"))
+            * len(settings.THUMBNAIL_FORMATS),
+        )
+        self.assertEqual(len(pages), RENDERS)
+        ready = thumbnails.lookup(self.post.image.name, "960x339")
+        self.assertEqual(
+            sum(ready["url"] in page for page in pages), 1
+        )
+        self.assertEqual(
+            sum("aspect-ratio: 960 / 339" in page for page in pages),
+            RENDERS - 1,
+        )
+
+    def test_concurrent_jobs_render_once(self):
+        """Задачи разных процессов не видят метку очереди друг друга;
+        рендер одного размера разделяет только блокировка.
+        """
+
+        name = self.post.image.name
+        real_get_thumbnail = thumbnails.get_thumbnail
+
+        def slow_get_thumbnail(*args, **kwargs):
+            time.sleep(0.2)
+            return real_get_thumbnail(*args, **kwargs)
+
+        barrier = threading.Barrier(RENDERS)
+
+        def job():
+            try:
+                barrier.wait()
+                thumbnails.generate_thumbnails(name)
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+            thumbnails, "get_thumbnail", side_effect=slow_get_thumbnail
+        ) as encode:
+            workers = [threading.Thread(target=job) for _ in range(RENDERS)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(
+            encode.call_count,
+            len(thumbnails.variant_widths("960x339"))
+            * len(settings.THUMBNAIL_FORMATS),
+        )
+
+    def test_locked_geometry_is_skipped(self):
+        """Пока размер рендерит другой процесс, повторного рендера нет,
+        и метка очереди остается.
+        """
+
+        name = self.post.image.name
+        key = thumbnails.thumbnail_key(name, "960x339")
+        cache.add(thumbnails._pending_key(name), True)
+        with file_lock(key), mock.patch.object(
+            thumbnails, "get_thumbnail"
+        ) as encode:
+            thumbnails.generate_thumbnails(name)
+        self.assertFalse(encode.called)
+        self.assertIsNone(cache.get(key))
+        self.assertTrue(cache.get(thumbnails._pending_key(name)))
+
+    def test_broken_source_is_not_requeued(self):
+        """Нечитаемый исходник не отправляется в пул с каждой страницей."""
+
+        name = default_storage.save(
+            "posts/broken.gif", ContentFile(b"not an image")
+        )
+        with mock.patch.object(
+            thumbnails, "get_thumbnail", wraps=thumbnails.get_thumbnail
+        ) as encode:
+            for _ in range(3):
+                self.assertIsNone(thumbnails.lookup(name, "960x339"))
+        self.assertEqual(encode.call_count, 1)
+        self.assertTrue(cache.get(thumbnails._pending_key(name)))
+
+    def test_ready_thumbnail_replaces_cached_placeholder(self):
+        """Готовая миниатюра меняет закэшированную страницу и ее ETag."""
+
+        name = self.post.image.name
+        # Картинка уже в очереди пула, так что страница - с заглушкой.
+        cache.add(thumbnails._pending_key(name), True)
+        url = reverse("posts:index")
+        before = self.client.get(url)
+        self.assertContains(before, "aspect-ratio: 960 / 339")
+
+        thumbnails.generate_thumbnails(name)
+
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+        ready = thumbnails.lookup(name, "960x339")
+        self.assertContains(after, ready["url"])
@@ -1,15 +1,19 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from yatube.settings import POSTS_PER_PAGE
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
+from .. import thumbnails
 from ..forms import PostForm
 from ..models import Comment, Follow, Group, Post, User
 
@@ -17,7 +21,7 @@ GAP = 3
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class ViewsTest(TestCase):
     """Тестирование Views."""
 
@@ -186,18 +190,76 @@ class ViewsTest(TestCase):
             "Комментария нет на странице поста",
         )
 
+    def test_thumbnail_placeholder_until_ready(self):
+        """Пока миниатюра готовится, вместо нее выводится заглушка."""
+
+        url = reverse("posts:post_detail", args=(self.post.pk,))
+        name = self.post.image.name
+        cache.add(thumbnails._pending_key(name), True)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, "aspect-ratio: 960 / 339")
+        self.assertIsNone(thumbnails.lookup(name, "960x339"))
+
+        thumbnails.generate_thumbnails(name)
+        ready = thumbnails.lookup(name, "960x339")
+        self.assertEqual((ready["width"], ready["height"]), (960, 339))
+        response = self.authorized_client.get(url)
+        self.assertContains(response, ready["url"])
+        self.assertNotContains(response, "aspect-ratio: 960 / 339")
+
+    def test_thumbnail_variants_in_srcset(self):
+        """Картинка отдается в нескольких ширинах, WebP и запасном JPEG."""
+
+        name = self.post.image.name
+        thumbnails.generate_thumbnails(name)
+        ready = thumbnails.lookup(name, "960x339")
+        self.assertTrue(ready["url"].endswith(".jpg"))
+        self.assertEqual(
+            [source["type"] for source in ready["sources"]], ["image/webp"]
+        )
+        for width in (320, 640, 960):
+            self.assertIn(f" {width}w", ready["srcset"])
+            self.assertIn(f" {width}w", ready["sources"][0]["srcset"])
+        response = self.authorized_client.get(reverse("posts:index"))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'type="image/webp"')
+
     def test_cache(self):
         """Тестирование кэша главной страницы."""
 
-        response = self.authorized_client.get(reverse("posts:index"))
-        Post.objects.get(id=1).delete()
-        new_response = self.authorized_client.get(reverse("posts:index"))
-        self.assertEqual(response.content, new_response.content)
-        cache.clear()
-        response_after_clear = self.authorized_client.get(
-            reverse("posts:index")
+        # Готовая миниатюра сама сдвигает версию ленты, поэтому она
+        # готовится до замера.
+        thumbnails.generate_thumbnails(self.post.image.name)
+        response = self.client.get(reverse("posts:index"))
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(reverse("posts:index"))
+        self.assertEqual(response.content, cached_response.content)
+        Post.objects.get(id=self.post.pk).delete()
+        response_after_delete = self.client.get(reverse("posts:index"))
+        self.assertNotEqual(response.content, response_after_delete.content)
+        self.assertNotIn(self.post, response_after_delete.context["page_obj"])
+
+    def test_group_cache_invalidated_by_writes(self):
+        """Новый пост и комментарий сразу сбрасывают кэш ленты группы."""
+
+        url = reverse("posts:group_list", args=(self.group.slug,))
+        response = self.client.get(url)
+        post = Post.objects.create(
+            author=self.user, text="Свежий пост", group=self.group
         )
-        self.assertNotEqual(response.content, response_after_clear.content)
+        response_after_post = self.client.get(url)
+        self.assertNotEqual(response.content, response_after_post.content)
+        self.assertIn(post, response_after_post.context["page_obj"])
+        Comment.objects.create(text="Новый", post=post, author=self.user)
+        self.assertIsNotNone(self.client.get(url).context)
+
+    def test_authorized_user_page_not_cached(self):
+        """Страницы авторизованного пользователя не берутся из кэша."""
+
+        self.authorized_client.get(reverse("posts:index"))
+        response = self.authorized_client.get(reverse("posts:index"))
+        self.assertIsNotNone(response.context)
 
     def test_authorized_user_can_follow_unfollow(self):
         """Авторизованный пользователь может подписываться на других
@@ -247,6 +309,30 @@ class ViewsTest(TestCase):
         post_list2 = Post.objects.filter(author__in=authors2)
         self.assertNotIn(post1, post_list2)
 
+    def test_follow_index_uses_inbox(self):
+        """Лента подписок собирается из inbox: подписка добавляет старые
+        посты автора, новый пост раскладывается подписчикам, отписка
+        убирает посты автора из ленты.
+        """
+
+        author = User.objects.create_user(username="Автор")
+        old_post = Post.objects.create(author=author, text="Старый пост")
+        self.authorized_client.get(
+            reverse("posts:profile_follow", args=(author.username,))
+        )
+        new_post = Post.objects.create(author=author, text="Новый пост")
+        response = self.authorized_client.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            list(response.context["page_obj"]), [new_post, old_post]
+        )
+        self.assertEqual(self.user.inbox.count(), 2)
+        self.authorized_client.get(
+            reverse("posts:profile_unfollow", args=(author.username,))
+        )
+        response = self.authorized_client.get(reverse("posts:follow_index"))
+        self.assertEqual(len(response.context["page_obj"]), 0)
+        self.assertFalse(self.user.inbox.exists())
+
 
 class Paginatorself(TestCase):
     """Тестирование паджинатора."""
@@ -302,3 +388,314 @@ class Paginatorself(TestCase):
                 GAP,
                 error_name,
             )
+
+    def test_cursor_page_context(self):
+        """Курсорная паджинация проходит ленту вперед и назад без пропусков."""
+
+        cache.clear()
+        pages = [
+            reverse("posts:index"),
+            reverse(
+                "posts:profile",
+                args=(self.user.username,),
+            ),
+            reverse(
+                "posts:group_list",
+                args=(self.group.slug,),
+            ),
+        ]
+        expected = list(Post.objects.all())
+        for page in pages:
+            with self.subTest(page=page):
+                first = self.client.get(page + "?cursor=").context["page_obj"]
+                self.assertEqual(list(first), expected[:POSTS_PER_PAGE])
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    page, {"cursor": first.next_cursor}
+                ).context["page_obj"]
+                self.assertEqual(list(second), expected[POSTS_PER_PAGE:])
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    page, {"cursor": second.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(list(back), list(first))
+                self.assertFalse(back.has_previous())
+
+    def test_next_from_numbered_page_switches_to_cursor(self):
+        """«Следующая» со страницы по номеру ведет на курсорную страницу,
+        которая выбирается без COUNT(*) и OFFSET.
+        """
+
+        cache.clear()
+        expected = list(Post.objects.all())
+        url = reverse("posts:index")
+        first = self.client.get(url)
+        page_obj = first.context["page_obj"]
+        self.assertEqual(page_obj.number, 1)
+        self.assertContains(first, f"?cursor={page_obj.next_cursor}")
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url, {"cursor": page_obj.next_cursor})
+        self.assertTrue(second.context["page_obj"].is_cursor)
+        self.assertEqual(
+            list(second.context["page_obj"]), expected[POSTS_PER_PAGE:]
+        )
+        sql = " ".join(query["sql"].upper() for query in queries)
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+        numbered = self.client.get(url, {"page": 2})
+        self.assertContains(
+            numbered, f"?cursor={numbered.context['page_obj'].previous_cursor}"
+        )
+        back = self.client.get(
+            url, {"cursor": numbered.context["page_obj"].previous_cursor}
+        )
+        self.assertEqual(
+            list(back.context["page_obj"]), expected[:POSTS_PER_PAGE]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+
+        response = self.client.get(reverse("posts:index") + "?cursor=%%%")
+        self.assertEqual(
+            len(response.context["page_obj"]), POSTS_PER_PAGE
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """Тестирование ответов 304 Not Modified."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.author = User.objects.create_user(username="Lermontov")
+        cls.group = Group.objects.create(title="Тестовая группа", slug="g")
+        cls.post = Post.objects.create(
+            author=cls.author, text="Тестовый пост", group=cls.group
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+        cache.clear()
+
+    def test_not_modified_until_write(self):
+        """Без изменений страница отдает 304, после записи - 200."""
+
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=(self.group.slug,)),
+            reverse("posts:profile", args=(self.author.username,)),
+            reverse("posts:post_detail", args=(self.post.pk,)),
+            reverse("posts:follow_index"),
+        )
+        # Первый ответ с формой выставляет CSRF-cookie, от которой
+        # зависит ETag страницы поста.
+        self.authorized_client.get(urls[-2])
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.authorized_client.get(url)["ETag"]
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertTemplateNotUsed(response, "base.html")
+                Comment.objects.create(
+                    post=self.post, author=self.user, text="Новый"
+                )
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_page_and_user(self):
+        """Другая страница и другой пользователь получают свой ETag."""
+
+        url = reverse("posts:index")
+        etag = self.authorized_client.get(url)["ETag"]
+        self.assertNotEqual(etag, self.client.get(url)["ETag"])
+        self.assertNotEqual(
+            etag, self.authorized_client.get(url, {"page": 2})["ETag"]
+        )
+
+    def test_etag_ignores_csrf_without_form(self):
+        """CSRF-cookie меняет ETag только страницы с формой."""
+
+        url = reverse("posts:index")
+        etag = self.client.get(url)["ETag"]
+        visitor = Client()
+        visitor.cookies["csrftoken"] = "a" * 64
+        self.assertEqual(visitor.get(url)["ETag"], etag)
+
+        post_url = reverse("posts:post_detail", args=(self.post.pk,))
+        self.authorized_client.get(post_url)
+        etags = {
+            self.authorized_client.get(url)["ETag"]: "index",
+            self.authorized_client.get(post_url)["ETag"]: "post",
+        }
+        self.authorized_client.cookies["csrftoken"] = "b" * 64
+        self.assertIn(self.authorized_client.get(url)["ETag"], etags)
+        self.assertNotIn(self.authorized_client.get(post_url)["ETag"], etags)
+
+
+class CommentPaginationTest(TestCase):
+    """Тестирование постраничной загрузки комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.post = Post.objects.create(author=cls.user, text="Тестовый пост")
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f"Текст {number}")
+            for number in range(COMMENTS_PER_PAGE + GAP)
+        )
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев."""
+
+        response = self.client.get(
+            reverse("posts:post_detail", args=(self.post.pk,))
+        )
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, reverse("posts:post_comments", args=(self.post.pk,))
+        )
+
+    def test_fragment_returns_next_page(self):
+        """Фрагмент отдает оставшиеся комментарии без разметки страницы."""
+
+        first = self.client.get(
+            reverse("posts:post_detail", args=(self.post.pk,))
+        ).context["comments"]
+        response = self.client.get(
+            reverse("posts:post_comments", args=(self.post.pk,)),
+            {"cursor": first.next_cursor},
+        )
+        comments = response.context["comments"]
+        self.assertEqual(
+            list(comments), list(self.post.comments.all()[COMMENTS_PER_PAGE:])
+        )
+        self.assertFalse(comments.has_next())
+        self.assertTemplateNotUsed(response, "base.html")
+
+    def test_fragment_of_missing_post(self):
+        """Комментарии несуществующего поста - 404, пустого - 200."""
+
+        response = self.client.get(reverse("posts:post_comments", args=(0,)))
+        self.assertEqual(response.status_code, 404)
+        quiet = Post.objects.create(author=self.post.author, text="Тихо")
+        response = self.client.get(
+            reverse("posts:post_comments", args=(quiet.pk,))
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryCountTest(TestCase):
+    """Число запросов страниц не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="Pushkin")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        cls.authors = [
+            User.objects.create_user(username=f"author{number}")
+            for number in range(GAP)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+            for number in range(GAP):
+                Post.objects.create(
+                    author=author, text=f"Пост {number}", group=cls.group
+                )
+        cls.post = Post.objects.first()
+        for author in cls.authors:
+            Comment.objects.create(post=cls.post, author=author, text="Да")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+        cache.clear()
+
+    def test_views_run_constant_number_of_queries(self):
+        """Шаблоны не догружают авторов, группы и счетчики по одному."""
+
+        # Сессия и пользователь запроса занимают еще два запроса,
+        # валидатор ETag группы, профиля и поста - по одному.
+        pages = (
+            (reverse("posts:index"), 4),
+            (reverse("posts:group_list", args=(self.group.slug,)), 6),
+            (reverse("posts:profile", args=(self.authors[0].username,)), 7),
+            (reverse("posts:post_detail", args=(self.post.pk,)), 5),
+            (reverse("posts:follow_index"), 4),
+        )
+        for url, queries in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.authorized_client.get(url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailBatchTest(TestCase):
+    """Миниатюры страницы ленты находятся одним запросом к кэшу."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Pushkin")
+        small_gif = (
+            b"\x47\x49\x46\x38\x39\x61\x02\x00"
+            b"\x01\x00\x80\x00\x00\x00\x00\x00"
+            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+            b"\x0A\x00\x3B"
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f"Пост {number}",
+                image=SimpleUploadedFile(
+                    name=f"batch{number}.gif",
+                    content=small_gif,
+                    content_type="image/gif",
+                ),
+            )
+            for number in range(GAP)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+        cache.clear()
+        for post in self.posts:
+            thumbnails.generate_thumbnails(post.image.name)
+
+    def test_page_resolves_thumbnails_in_one_lookup(self):
+        with mock.patch.object(
+            thumbnails, "cache", wraps=thumbnails.cache
+        ) as thumbnail_cache, mock.patch.object(
+            thumbnails, "default_storage", wraps=thumbnails.default_storage
+        ) as storage:
+            response = self.authorized_client.get(reverse("posts:index"))
+        self.assertEqual(thumbnail_cache.get_many.call_count, 1)
+        self.assertFalse(thumbnail_cache.get.called)
+        self.assertFalse(storage.exists.called)
+        for post in self.posts:
+            ready = thumbnails.lookup(post.image.name, "960x339")
+            self.assertContains(response, ready["url"])
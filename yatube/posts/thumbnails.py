@@ -0,0 +1,242 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Шаблоны не рендерят миниатюры сами: они берут из кэша адрес уже готовой
+миниатюры (``lookup``), а пока ее нет - показывают заглушку и ставят
+картинку в очередь пула ``THUMBNAIL_WORKERS``.
+
+Каждый размер из ``THUMBNAIL_GEOMETRIES`` готовится в нескольких
+ширинах (``THUMBNAIL_WIDTHS``) и форматах (``THUMBNAIL_FORMATS``) для
+``srcset``; последний формат - запасной для браузеров без остальных.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import delete, get_thumbnail
+
+from core.locks import file_lock
+from .feeds import (FEED_ALL, FEED_AUTHOR, FEED_GROUP, FEED_POST,
+                    bump_feed_version)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PENDING_TIMEOUT = 60
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+def thumbnail_key(name, geometry):
+    # Набор вариантов входит в ключ: смена настроек готовит их заново.
+    variants = f"{settings.THUMBNAIL_WIDTHS}:{settings.THUMBNAIL_FORMATS}"
+    digest = hashlib.md5(f"{name}:{geometry}:{variants}".encode()).hexdigest()
+    return f"thumbnail:{digest}"
+
+
+def variant_widths(geometry):
+    """Ширины вариантов размера: не больше самого размера, по возрастанию."""
+
+    width = int(geometry.split("x")[0])
+    widths = {w for w in settings.THUMBNAIL_WIDTHS if w < width}
+    return sorted(widths | {width})
+
+
+def _render_variants(name, geometry, options):
+    """Рендерит все варианты размера; None, если исходник не читается."""
+
+    width, height = map(int, geometry.split("x"))
+    srcsets = {}
+    for fmt in settings.THUMBNAIL_FORMATS:
+        for variant_width in variant_widths(geometry):
+            variant_height = round(height * variant_width / width)
+            variant = f"{variant_width}x{variant_height}"
+            thumbnail = get_thumbnail(name, variant, format=fmt, **options)
+            if not thumbnail.exists():
+                # Исходник пропал или не читается: sorl уже записал ошибку.
+                return None
+            srcsets.setdefault(fmt, []).append(
+                f"{thumbnail.url} {thumbnail.width}w"
+            )
+    *formats, fallback = settings.THUMBNAIL_FORMATS
+    return {
+        "url": thumbnail.url,
+        "width": thumbnail.width,
+        "height": thumbnail.height,
+        "srcset": ", ".join(srcsets[fallback]),
+        "sources": [
+            {"type": MIME_TYPES[fmt], "srcset": ", ".join(srcsets[fmt])}
+            for fmt in formats
+        ],
+    }
+
+
+def _pending_key(name):
+    return "thumbnail_pending:" + hashlib.md5(name.encode()).hexdigest()
+
+
+def generate_thumbnails(name):
+    """Рендерит все размеры из THUMBNAIL_GEOMETRIES со всеми вариантами
+    и запоминает их адреса.
+
+    Каждый размер рендерит только тот, кто взял его блокировку
+    (``file_lock``, общую для процессов сервера): остальные пропускают
+    его, а шаблоны пока показывают заглушку. Метку очереди снимает
+    только тот, кто ничего не пропустил, иначе картинку снова поставили
+    бы в очередь, пока другой процесс ее еще рендерит.
+
+    Если исходник не читается, метка очереди ставится заново на
+    PENDING_TIMEOUT: иначе каждая страница с этой картинкой снова
+    отправляла бы ее в пул.
+    """
+
+    rendered = skipped = failed = False
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.items():
+        key = thumbnail_key(name, geometry)
+        if cache.get(key) is not None:
+            continue
+        with file_lock(key, blocking=False) as locked:
+            if not locked:
+                skipped = True
+                continue
+            thumbnail = _render_variants(name, geometry, options)
+            if thumbnail is None:
+                failed = True
+                break
+            cache.set(key, thumbnail, None)
+            rendered = True
+    if failed:
+        cache.set(_pending_key(name), True, PENDING_TIMEOUT)
+    elif not skipped:
+        cache.delete(_pending_key(name))
+    if rendered:
+        _bump_image_feeds(name)
+
+
+def _bump_image_feeds(name):
+    """Сдвигает версии страниц с постами этой картинки.
+
+    Пока миниатюры не было, страницы закэшировались и получили ETag
+    с заглушкой; новые версии заставляют отрендерить их заново.
+    """
+
+    posts = (
+        Post.objects.filter(image=name)
+        .values_list("pk", "author_id", "group_id")
+        .iterator()
+    )
+    authors, groups = set(), set()
+    for post_id, author_id, group_id in posts:
+        bump_feed_version(FEED_POST, post_id)
+        authors.add(author_id)
+        groups.add(group_id)
+    bump_feed_version(FEED_ALL)
+    for author_id in authors:
+        bump_feed_version(FEED_AUTHOR, author_id)
+    for group_id in groups - {None}:
+        bump_feed_version(FEED_GROUP, group_id)
+
+
+def _run(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        logger.exception("Не удалось подготовить миниатюры %s", name)
+    finally:
+        if settings.THUMBNAIL_WORKERS:
+            close_old_connections()
+
+
+def _source_exists(name):
+    try:
+        return default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def request_thumbnails(name):
+    """Ставит картинку в очередь, если она еще не стоит там.
+
+    Картинка без файла в хранилище не ставится, а метка очереди остается
+    на PENDING_TIMEOUT и избавляет от повторных проверок хранилища.
+    """
+
+    if not cache.add(_pending_key(name), True, PENDING_TIMEOUT):
+        return
+    if not _source_exists(name):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        _run(name)
+    else:
+        _get_executor().submit(_run, name)
+
+
+def schedule_thumbnails(name):
+    """Готовит миниатюры новой картинки после фиксации транзакции."""
+
+    if name:
+        transaction.on_commit(lambda: request_thumbnails(name))
+
+
+def delete_image(name):
+    """Удаляет файл картинки, все его миниатюры и их адреса в кэше."""
+
+    if _source_exists(name):
+        delete(name)
+    cache.delete_many(
+        [thumbnail_key(name, geometry)
+         for geometry in settings.THUMBNAIL_GEOMETRIES]
+    )
+
+
+def lookup_many(names, geometry):
+    """Готовые миниатюры для набора картинок.
+
+    Миниатюра - словарь с ``url``, ``width``, ``height`` и ``srcset``
+    запасного формата и ``sources`` ({type, srcset}) остальных форматов.
+
+    Возвращает словарь {имя: миниатюра} только для готовых миниатюр;
+    остальные ставятся в очередь. Для уже готовой страницы это один
+    запрос к кэшу, сколько бы картинок на ней ни было.
+    """
+
+    names = set(filter(None, names))
+    keys = {thumbnail_key(name, geometry): name for name in names}
+    ready = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = names - ready.keys()
+    if not missing:
+        return ready
+    pending = {_pending_key(name): name for name in missing}
+    queued = cache.get_many(pending)
+    requested = [name for key, name in pending.items() if key not in queued]
+    for name in requested:
+        request_thumbnails(name)
+    if requested:
+        # Без пула миниатюры уже готовы к этому моменту.
+        keys = {thumbnail_key(name, geometry): name for name in requested}
+        ready.update(
+            (keys[key], value) for key, value in cache.get_many(keys).items()
+        )
+    return ready
+
+
+def lookup(name, geometry):
+    """Готовая миниатюра (см. ``lookup_many``) или None."""
+
+    return lookup_many([name], geometry).get(name)
@@ -1,16 +1,28 @@
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from core.utils import paginate
+from django.views.decorators.http import condition
+
+from core.decorators import bounded_uploads, cache_anonymous_page
+from core.utils import CursorPaginator, paginate
+from yatube.settings import COMMENTS_PER_PAGE
+from .feeds import (FEED_ALL, FEED_AUTHOR, FEED_FOLLOW, FEED_GROUP,
+                    feed_count_key, follow_etag, group_etag, group_version,
+                    index_etag, index_version, post_etag, profile_etag)
+from .exports import CONTENT_TYPES, EXPORT_FIELDS, export_lines
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
 
 
+@condition(etag_func=index_etag)
+@cache_anonymous_page(index_version)
 def index(request):
     """Главная страница."""
 
     posts = Post.objects.select_related("author", "group")
-    page_obj = paginate(request, posts)
+    page_obj = paginate(request, posts, count_key=feed_count_key(FEED_ALL))
     context = {
         "title": "Последние обновления на сайте",
         "page_obj": page_obj,
@@ -18,12 +30,16 @@ def index(request):
     return render(request, "posts/index.html", context)
 
 
+@condition(etag_func=group_etag)
+@cache_anonymous_page(group_version)
 def group_posts(request, slug):
     """Страница постов одной группы."""
 
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginate(request, posts)
+    posts = group.posts.select_related("author")
+    page_obj = paginate(
+        request, posts, count_key=feed_count_key(FEED_GROUP, group.pk)
+    )
     context = {
         "title": f'Записи сообщества "{group}"',
         "group": group,
@@ -32,14 +48,22 @@ def group_posts(request, slug):
     return render(request, "posts/group_list.html", context)
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
     """Страница профайла пользователя."""
 
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginate(request, post_list)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    post_list = author.posts.select_related("group")
+    page_obj = paginate(
+        request, post_list, count_key=feed_count_key(FEED_AUTHOR, author.pk)
+    )
     user = request.user
-    following = user.is_authenticated and author.following.exists()
+    following = (
+        user.is_authenticated
+        and author.following.filter(user=user).exists()
+    )
     context = {
         "page_obj": page_obj,
         "author": author,
@@ -48,11 +72,16 @@ def profile(request, username):
     return render(request, "posts/profile.html", context)
 
 
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     """Страница поста."""
 
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), id=post_id
+    )
+    comments = CursorPaginator(
+        post.comments.select_related("author"), COMMENTS_PER_PAGE
+    ).page()
     form = CommentForm(request.POST or None)
     context = {
         "title": f"Пост {post}",
@@ -63,7 +92,62 @@ def post_detail(request, post_id):
     return render(request, "posts/post_detail.html", context)
 
 
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев поста.
+
+    Существование поста проверяется, только если страница пуста.
+    """
+
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        "author"
+    )
+    page = paginate(request, comments, COMMENTS_PER_PAGE, keyset=True)
+    if not page and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        "post_id": post_id,
+        "comments": page,
+    }
+    return render(request, "includes/comment_list.html", context)
+
+
+def search(request):
+    """Поиск по текстам постов."""
+
+    query = request.GET.get("q", "").strip()
+    posts = search_posts(query, Post.objects.select_related("author", "group"))
+    context = {
+        "title": "Поиск",
+        "query": query,
+        "page_obj": paginate(request, posts, keyset=True),
+    }
+    return render(request, "posts/search.html", context)
+
+
+@login_required
+def export(request, username, kind):
+    """Выгрузка постов или комментариев автора потоком NDJSON или CSV.
+
+    Доступна самому автору и персоналу.
+    """
+
+    fmt = request.GET.get("format", "ndjson")
+    if kind not in EXPORT_FIELDS or fmt not in CONTENT_TYPES:
+        raise Http404
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    response = StreamingHttpResponse(
+        export_lines(author, kind, fmt), content_type=CONTENT_TYPES[fmt]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{author.pk}-{kind}.{fmt}"'
+    )
+    return response
+
+
 @login_required
+@bounded_uploads
 def post_create(request):
     """Страница добавления нового поста."""
 
@@ -82,6 +166,7 @@ def post_create(request):
 
 
 @login_required
+@bounded_uploads
 def post_edit(request, post_id):
     """Страница редактирования поста."""
 
@@ -116,12 +201,16 @@ def add_comment(request, post_id):
 
 
 @login_required
+@condition(etag_func=follow_etag)
 def follow_index(request):
     """Страница постов на подписанных авторов."""
 
     user = request.user
-    posts_list = Post.objects.filter(author__following__user=user)
-    page_obj = paginate(request, posts_list)
+    entries = user.inbox.select_related("post__author", "post__group")
+    page_obj = paginate(
+        request, entries, count_key=feed_count_key(FEED_FOLLOW, user.pk)
+    )
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
     context = {
         "title": "Избранные авторы",
         "page_obj": page_obj,
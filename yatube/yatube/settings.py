@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -48,10 +49,12 @@ INSTALLED_APPS = [
     "users.apps.UsersConfig",
     "core.apps.CoreConfig",
     "about.apps.AboutConfig",
+    "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.profiling.RequestProfilerMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -149,8 +152,65 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 POSTS_PER_PAGE = 10
 
+COMMENTS_PER_PAGE = 20
+
+FEED_COUNT_TIMEOUT = 60 * 60 * 24
+
+FEED_PAGE_TIMEOUT = 60 * 10
+
+# Строк выгрузки постов и комментариев автора на один запрос к базе.
+EXPORT_CHUNK_SIZE = 2000
+
+# Профилирование запросов (core.profiling): доля случайных запросов,
+# интервал снятия стеков в секундах, срок жизни токена заголовка
+# X-Profile, число хранимых профилей и запросов к базе в профиле.
+PROFILER_SAMPLE_RATE = 0
+PROFILER_INTERVAL = 0.005
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+PROFILER_KEEP = 1000
+PROFILER_MAX_QUERIES = 50
+
+# Размеры миниатюр, которые используют шаблоны: {"геометрия": {опции}}.
+THUMBNAIL_GEOMETRIES = {
+    "960x339": {"crop": "center", "upscale": True},
+}
+
+# Ширины вариантов каждого размера для srcset.
+THUMBNAIL_WIDTHS = (320, 640, 960)
+
+# Форматы вариантов; последний - запасной для <img>.
+THUMBNAIL_FORMATS = ("WEBP", "JPEG")
+
+# Потоков для фоновой подготовки миниатюр; 0 - готовить синхронно.
+THUMBNAIL_WORKERS = 2
+
+# Пределы загружаемых картинок: размер файла и число пикселей.
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+# Процессов для полного декодирования загрузок; 0 - в процессе запроса.
+IMAGE_DECODE_WORKERS = 2
+
+IMAGE_DECODE_TIMEOUT = 30
+
+# Картинку, которую повторно использовали не раньше стольких секунд
+# назад, при удалении поста не удаляют: ее новый пост может быть еще
+# не сохранен. Такие файлы убирает collect_media_garbage.
+IMAGE_REUSE_GRACE = 60
+
+# Файлы блокировок между процессами (core.locks); каталог должен быть
+# общим для всех воркеров сервера.
+LOCK_ROOT = os.path.join(tempfile.gettempdir(), "yatube-locks")
+
+LOCK_STRIPES = 256
+
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
+# LocMemCache у каждого процесса свой: версии лент, счетчики и адреса
+# миниатюр не видны соседним воркерам. Если воркеров несколько, нужен
+# общий кэш (Memcached, Redis). Блокировки между процессами на кэш не
+# опираются (см. core.locks).
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",